@@ -3,6 +3,143 @@ from typing import Dict, List
 
 import numpy as np
 
+# Patterns used on every listing feature, compiled once
+DIGITS_PATTERN = re.compile(r"\d+")
+USEFUL_AREA_PATTERN = re.compile(r"\d+(?= m² útiles)")
+AREA_PATTERN = re.compile(r"(\d+) m² construidos, (\d+) m² útiles")
+BEDROOMS_PATTERN = re.compile(r"\d+(?= habita)")
+NUMBER_PATTERN = re.compile(r"[\d]+[.,\d]+|[\d]*[.][\d]+|[\d]+")
+
+
+def _parse_area(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+    # Usual format, both areas are parsed with a single match
+    match = AREA_PATTERN.fullmatch(lower_feature)
+    if match:
+        dict_out["BUILT_AREA"] = int(match.group(1))
+        dict_out["USEFUL_AREA"] = int(match.group(2))
+        return
+    if "construidos" in lower_feature:
+        dict_out["BUILT_AREA"] = int(
+            DIGITS_PATTERN.findall(lower_feature.split("construidos")[0])[0]
+        )
+    if "útiles" in lower_feature:
+        dict_out["USEFUL_AREA"] = int(USEFUL_AREA_PATTERN.search(lower_feature).group())
+
+
+def _parse_num_floors(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+    # Valid for single family homes
+    dict_out["NUM_FLOORS"] = int(DIGITS_PATTERN.search(lower_feature).group())
+
+
+def _parse_year_built(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+    dict_out["YEAR_BUILT"] = int(DIGITS_PATTERN.search(lower_feature).group())
+
+
+def _parse_lot_area(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+    # Valid for single family homes
+    lot_area = NUMBER_PATTERN.search(lower_feature).group()
+    dict_out["LOT_AREA"] = int(lot_area.replace(".", ""))
+
+
+def _parse_bedrooms(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+    if "sin" in lower_feature:
+        dict_out["NUM_BEDROOMS"] = 0
+    else:
+        dict_out["NUM_BEDROOMS"] = int(BEDROOMS_PATTERN.search(feature).group())
+
+
+def _parse_bathrooms(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+    if "sin" in lower_feature:
+        dict_out["NUM_BATHROOMS"] = 0
+    else:
+        dict_out["NUM_BATHROOMS"] = int(DIGITS_PATTERN.search(lower_feature).group())
+
+
+def _parse_parking(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+    dict_out["FLAG_PARKING"] = True
+    dict_out["PARKING_INCLUDED"] = "incluida" in lower_feature
+
+    if not dict_out["PARKING_INCLUDED"]:
+        parking_price = NUMBER_PATTERN.findall(lower_feature)[0]
+        dict_out["PARKING_PRICE"] = int(parking_price.replace(".", ""))
+
+
+def _parse_furniture(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+    if "amueblado" in lower_feature:
+        dict_out["FURNISHED"] = True
+    elif "sin amueblar" in lower_feature:
+        dict_out["FURNISHED"] = False
+    if "cocina equipada" in lower_feature:
+        dict_out["KITCHEN_EQUIPPED"] = True
+    elif "cocina sin equipar" in lower_feature:
+        dict_out["KITCHEN_EQUIPPED"] = False
+
+
+def _set_value(key: str, value):
+    def handler(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+        dict_out[key] = value
+
+    return handler
+
+
+def _set_feature(key: str):
+    def handler(feature: str, lower_feature: str, dict_out: Dict[str, str]):
+        dict_out[key] = feature
+
+    return handler
+
+
+# Basic feature handlers by keyword pattern, in order of precedence: when a feature
+# matches several patterns, only the handler of the first one is applied
+BASIC_FEATURE_HANDLERS = {
+    "area": ("construidos|útiles", _parse_area),
+    "num_floors": ("planta", _parse_num_floors),
+    "lot_area": ("parcela", _parse_lot_area),
+    "bedrooms": ("habitaci", _parse_bedrooms),
+    "bathrooms": ("baño", _parse_bathrooms),
+    "parking": ("garaje", _parse_parking),
+    "condition": ("promoción|segunda mano", _set_feature("CONDITION")),
+    "wardrobe": ("armario", _set_value("BUILTIN_WARDROBE", True)),
+    "storage_room": ("trastero", _set_value("STORAGE_ROOM", True)),
+    "orientation": ("orientación", _set_feature("CARDINAL_ORIENTATION")),
+    "heating": ("calefacción", _set_feature("HEATING")),
+    "accesibility": ("movilidad reducida", _set_value("ACCESIBILITY_FLAG", True)),
+    "year_built": ("construido en", _parse_year_built),
+    "terrace": ("terraza", _set_value("TERRACE", True)),
+    "balcony": ("balcón", _set_value("BALCONY", True)),
+    "furniture": ("amuebla|cocina", _parse_furniture),
+}
+# A single pattern finds every keyword in a feature in one pass. The lookahead
+# makes the matches zero-width, so overlapping keywords are all reported.
+BASIC_FEATURE_PATTERN = re.compile(
+    "(?={})".format(
+        "|".join(f"(?P<{k}>{p})" for k, (p, _) in BASIC_FEATURE_HANDLERS.items())
+    )
+)
+
+
+# Building and amenity keywords, all found in one pass over each feature. Matches
+# are zero-width lookaheads, so "entreplanta" also reports "planta".
+BUILDING_KEYWORDS_PATTERN = re.compile(
+    "(?=(bajo|entreplanta|planta|interior|exterior|ascensor))"
+)
+# Amenity column by keyword, in order of precedence
+AMENITY_FEATURES = {
+    "aire acondicionado": "AIR_CONDITIONING",
+    "piscina": "POOL",
+    "zonas verdes": "GREEN_AREAS",
+    "jardín": "GREEN_AREAS",
+}
+AMENITY_KEYWORDS_PATTERN = re.compile("(?=({}))".format("|".join(AMENITY_FEATURES)))
+
+
+# Energy column and unit of its value by keyword
+ENERGY_FEATURES = {
+    "consumo": ("kwh", "ENERGY_CONSUMPTION"),
+    "emisiones": ("kg co2", "ENERGY_EMISSIONS"),
+}
+ENERGY_LABEL_PATTERN = re.compile(r"\S\s+([^\W\d_])\s*$")
+
 
 def split_basic_features(features: List[str]) -> Dict[str, str]:
     """Split basic listing features into a dictionary of key-value pairs"""
@@ -30,113 +167,18 @@ def split_basic_features(features: List[str]) -> Dict[str, str]:
     dict_out["NUM_FLOORS"] = np.nan
 
     # Process each feature and update the dictionary
-    copy_features = features.copy()
-    for feature in copy_features:
+    unparsed_features = []
+    for feature in features:
         lower_feature = feature.lower()
+        matches = {m.lastgroup for m in BASIC_FEATURE_PATTERN.finditer(lower_feature)}
+        key = next((k for k in BASIC_FEATURE_HANDLERS if k in matches), None)
+        if key is None:
+            unparsed_features.append(feature)
+        else:
+            BASIC_FEATURE_HANDLERS[key][1](feature, lower_feature, dict_out)
 
-        if "construidos" in lower_feature or "útiles" in lower_feature:
-            if "construidos" in lower_feature:
-                dict_out["BUILT_AREA"] = int(
-                    re.findall(r"\d+", lower_feature.split("construidos")[0])[0]
-                )
-            if "útiles" in lower_feature:
-                dict_out["USEFUL_AREA"] = int(
-                    re.search(r"\d+(?= m² útiles)", lower_feature).group()
-                )
-            features.remove(feature)
-
-        elif "planta" in lower_feature:
-            # Valid for single family homes
-            dict_out["NUM_FLOORS"] = int(re.search(r"\d+", lower_feature).group())
-            features.remove(feature)
-
-        elif "parcela" in lower_feature:
-            # Valid for single family homes
-            lot_area = re.search(
-                r"[\d]+[.,\d]+|[\d]*[.][\d]+|[\d]+", lower_feature
-            ).group()
-            dict_out["LOT_AREA"] = int(lot_area.replace(".", ""))
-            features.remove(feature)
-
-        elif "habitaci" in lower_feature:
-            if "sin" in lower_feature:
-                dict_out["NUM_BEDROOMS"] = 0
-            else:
-                dict_out["NUM_BEDROOMS"] = int(
-                    re.search(r"\d+(?= habita)", feature).group()
-                )
-            features.remove(feature)
-
-        elif "baño" in lower_feature:
-            if "sin" in lower_feature:
-                dict_out["NUM_BATHROOMS"] = 0
-            else:
-                dict_out["NUM_BATHROOMS"] = int(
-                    re.search(r"\d+", lower_feature).group()
-                )
-            features.remove(feature)
-
-        elif "garaje" in lower_feature:
-            dict_out["FLAG_PARKING"] = True
-            dict_out["PARKING_INCLUDED"] = "incluida" in lower_feature
-
-            if not dict_out["PARKING_INCLUDED"]:
-                parking_price = re.findall(
-                    r"[\d]+[.,\d]+|[\d]*[.][\d]+|[\d]+", lower_feature
-                )[0]
-                dict_out["PARKING_PRICE"] = int(parking_price.replace(".", ""))
-
-            features.remove(feature)
-
-        elif "promoción" in lower_feature or "segunda mano" in lower_feature:
-            dict_out["CONDITION"] = feature
-            features.remove(feature)
-
-        elif "armario" in lower_feature:
-            dict_out["BUILTIN_WARDROBE"] = True
-            features.remove(feature)
-
-        elif "trastero" in lower_feature:
-            dict_out["STORAGE_ROOM"] = True
-            features.remove(feature)
-
-        elif "orientación" in lower_feature:
-            dict_out["CARDINAL_ORIENTATION"] = feature
-            features.remove(feature)
-
-        elif "calefacción" in lower_feature:
-            dict_out["HEATING"] = feature
-            features.remove(feature)
-
-        elif "movilidad reducida" in lower_feature:
-            dict_out["ACCESIBILITY_FLAG"] = True
-            features.remove(feature)
-
-        elif "construido en" in lower_feature:
-            dict_out["YEAR_BUILT"] = int(re.search(r"\d+", lower_feature).group())
-            features.remove(feature)
-
-        elif "terraza" in lower_feature:
-            dict_out["TERRACE"] = True
-            features.remove(feature)
-
-        elif "balcón" in lower_feature:
-            dict_out["BALCONY"] = True
-            features.remove(feature)
-
-        elif "amuebla" in lower_feature or "cocina" in lower_feature:
-            if "amueblado" in lower_feature:
-                dict_out["FURNISHED"] = True
-            elif "sin amueblar" in lower_feature:
-                dict_out["FURNISHED"] = False
-            if "cocina equipada" in lower_feature:
-                dict_out["KITCHEN_EQUIPPED"] = True
-            elif "cocina sin equipar" in lower_feature:
-                dict_out["KITCHEN_EQUIPPED"] = False
-            features.remove(feature)
-
-    if features:
-        print(f"WARNING: The following features were not parsed: {features}")
+    if unparsed_features:
+        print(f"WARNING: The following features were not parsed: {unparsed_features}")
 
     return dict_out
 
@@ -151,39 +193,37 @@ def split_building_features(features: List[str]) -> Dict[str, str]:
     dict_out["ELEVATOR"] = None
 
     # Process each feature and update the dictionary
-    copy_features = features.copy()
-    for feature in copy_features:
+    unparsed_features = []
+    for feature in features:
         lower_feature = feature.lower()
-        if any(
-            [
-                word in lower_feature
-                for word in ["bajo", "planta", "interior", "exterior"]
-            ]
-        ):
-            if "bajo" in lower_feature or "planta" in lower_feature:
+        keywords = set(BUILDING_KEYWORDS_PATTERN.findall(lower_feature))
+        if keywords & {"bajo", "planta", "interior", "exterior"}:
+            if "bajo" in keywords or "planta" in keywords:
                 # Floor number
-                if "bajo" in lower_feature:
+                if "bajo" in keywords:
                     dict_out["FLOOR"] = 0
-                elif "entreplanta" in lower_feature:
+                elif "entreplanta" in keywords:
                     dict_out["FLOOR"] = 0.5
                 else:
-                    dict_out["FLOOR"] = float(re.search(r"\d+", lower_feature).group())
-            if "interior" in lower_feature or "exterior" in lower_feature:
-                if "interior" in lower_feature:
-                    dict_out["PROPERTY_ORIENTATION"] = "Interior"
-                elif "exterior" in lower_feature:
-                    dict_out["PROPERTY_ORIENTATION"] = "Exterior"
-            features.remove(feature)
-
-        elif "ascensor" in lower_feature:
+                    dict_out["FLOOR"] = float(
+                        DIGITS_PATTERN.search(lower_feature).group()
+                    )
+            if "interior" in keywords:
+                dict_out["PROPERTY_ORIENTATION"] = "Interior"
+            elif "exterior" in keywords:
+                dict_out["PROPERTY_ORIENTATION"] = "Exterior"
+
+        elif "ascensor" in keywords:
             if "con" in lower_feature:
                 dict_out["ELEVATOR"] = True
             elif "sin" in lower_feature:
                 dict_out["ELEVATOR"] = False
-            features.remove(feature)
 
-    if features:
-        print(f"WARNING: The following features were not parsed: {features}")
+        else:
+            unparsed_features.append(feature)
+
+    if unparsed_features:
+        print(f"WARNING: The following features were not parsed: {unparsed_features}")
 
     return dict_out
 
@@ -197,26 +237,23 @@ def split_amenity_features(features: List[str]) -> Dict[str, str]:
     dict_out["GREEN_AREAS"] = False
 
     # Process each feature and update the dictionary
-    copy_features = features.copy()
-    for feature in copy_features:
+    unparsed_features = []
+    for feature in features:
         lower_feature = feature.lower()
-        if "aire acondicionado" in lower_feature:
-            dict_out["AIR_CONDITIONING"] = True
-            features.remove(feature)
-        elif "piscina" in lower_feature:
-            dict_out["POOL"] = True
-            features.remove(feature)
-        elif "zonas verdes" in lower_feature or "jardín" in lower_feature:
-            dict_out["GREEN_AREAS"] = True
-            features.remove(feature)
+        keywords = set(AMENITY_KEYWORDS_PATTERN.findall(lower_feature))
+        key = next((k for k in AMENITY_FEATURES if k in keywords), None)
+        if key is None:
+            unparsed_features.append(feature)
+        else:
+            dict_out[AMENITY_FEATURES[key]] = True
 
     # Set default values for keys that were not found in the features
     dict_out.setdefault("AIR_CONDITIONING", False)
     dict_out.setdefault("POOL", False)
     dict_out.setdefault("GREEN_AREAS", False)
 
-    if features:
-        print(f"WARNING: The following features were not parsed: {features}")
+    if unparsed_features:
+        print(f"WARNING: The following features were not parsed: {unparsed_features}")
 
     return dict_out
 
@@ -233,40 +270,28 @@ def split_energy_features(features: List[str]) -> Dict[str, str]:
     dict_out["ENERGY_EMISSIONS_LABEL"] = None
 
     # Process each feature and update the dictionary
-    copy_features = features.copy()
-    for feature in copy_features:
+    unparsed_features = []
+    for i, feature in enumerate(features):
         lower_feature = feature.lower()
-        if "consumo" not in lower_feature and "emisiones" not in lower_feature:
+        keywords = [k for k in ENERGY_FEATURES if k in lower_feature]
+        if not keywords:
             dict_out["STATUS_EPC"] = feature
-            features.remove(feature)
+            unparsed_features.extend(features[i + 1 :])
             break
         else:
             dict_out["STATUS_EPC"] = "Disponible"
-            if "consumo" in lower_feature:
-                s = lower_feature.split()
-                if "kwh" in lower_feature:
-                    dict_out["ENERGY_CONSUMPTION"] = float(
-                        re.search(r"[\d]+[.,\d]+|[\d]*[.][\d]+|[\d]+", lower_feature)
-                        .group()
-                        .replace(",", ".")
-                    )
-                if len(s) > 1:
-                    if len(s[-1]) == 1 and s[-1].isalpha():
-                        dict_out["ENERGY_CONSUMPTION_LABEL"] = s[-1]
-            if "emisiones" in lower_feature:
-                s = lower_feature.split()
-                if "kg co2" in lower_feature:
-                    dict_out["ENERGY_EMISSIONS"] = float(
-                        re.search(r"[\d]+[.,\d]+|[\d]*[.][\d]+|[\d]+", lower_feature)
-                        .group()
-                        .replace(",", ".")
+            # The rating label is the last word of the feature, a single letter
+            label = ENERGY_LABEL_PATTERN.search(lower_feature)
+            for keyword in keywords:
+                unit, column = ENERGY_FEATURES[keyword]
+                if unit in lower_feature:
+                    dict_out[column] = float(
+                        NUMBER_PATTERN.search(lower_feature).group().replace(",", ".")
                     )
-                if len(s) > 1:
-                    if len(s[-1]) == 1 and s[-1].isalpha():
-                        dict_out["ENERGY_EMISSIONS_LABEL"] = s[-1]
-            features.remove(feature)
+                if label:
+                    dict_out[f"{column}_LABEL"] = label.group(1)
 
-    if features:
-        print(f"WARNING: The following features were not parsed: {features}")
+    if unparsed_features:
+        print(f"WARNING: The following features were not parsed: {unparsed_features}")
 
     return dict_out
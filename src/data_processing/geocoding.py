@@ -1,4 +1,7 @@
+import asyncio
 import re
+from collections import OrderedDict
+from typing import Any, Dict
 
 import pandas as pd
 from geopy.adapters import AioHTTPAdapter
@@ -6,12 +9,43 @@ from geopy.extra.rate_limiter import AsyncRateLimiter
 from geopy.geocoders import Nominatim
 from tqdm import tqdm
 
+# Geocode details by (full address, generic location), shared by all the batches of
+# a run so that repeated addresses are only requested once to Nominatim. The least
+# recently used addresses are evicted once it holds GEOCODE_CACHE_SIZE entries.
+GEOCODE_CACHE = OrderedDict()
+GEOCODE_CACHE_SIZE = 10_000
+# Output columns by geocode detail
+GEOCODE_COLUMNS = {
+    "full_address": "FULL_ADDRESS",
+    "postal_code": "ZIP_CODE",
+    "latitude": "LATITUDE",
+    "longitude": "LONGITUDE",
+    "importance": "IMPORTANCE_LOCATION",
+    "place_id": "LOCATION_ID",
+}
 
-async def get_geocode_details(address1: str, address2: str, geocode) -> pd.Series:
+
+async def get_geocode_details(address1: str, address2: str, geocode) -> Dict[str, Any]:
     """
     Get geocode details given two addresses. The first address is the full address
     and the second address is the generic location. A geocode object from geopy.geocoders
     is required as an argument."""
+    key = (address1, address2)
+    if key in GEOCODE_CACHE:
+        GEOCODE_CACHE.move_to_end(key)
+        return GEOCODE_CACHE[key]
+    details = await _get_geocode_details(address1, address2, geocode)
+    # Misses are not cached: the rate limiter also turns transient Nominatim errors
+    # into missing locations, so the address is requested again next time
+    if details["full_address"] is not None:
+        GEOCODE_CACHE[key] = details
+        if len(GEOCODE_CACHE) > GEOCODE_CACHE_SIZE:
+            GEOCODE_CACHE.popitem(last=False)
+    return details
+
+
+async def _get_geocode_details(address1: str, address2: str, geocode) -> Dict[str, Any]:
+    """Request the geocode details of two addresses, see get_geocode_details."""
     # If address doesn't have a number, add a 1
     if not re.search(r"\d", address1):
         address1_split = address1.split(",")
@@ -32,27 +66,16 @@ async def get_geocode_details(address1: str, address2: str, geocode) -> pd.Serie
             zip_code = zip_code
         else:
             zip_code = None
-        return pd.Series(
-            {
-                "full_address": location.raw["display_name"],
-                "postal_code": zip_code,
-                "latitude": location.latitude,
-                "longitude": location.longitude,
-                "importance": location.raw.get("importance"),
-                "place_id": location.raw.get("place_id"),
-            }
-        )
+        return {
+            "full_address": location.raw["display_name"],
+            "postal_code": zip_code,
+            "latitude": location.latitude,
+            "longitude": location.longitude,
+            "importance": location.raw.get("importance"),
+            "place_id": location.raw.get("place_id"),
+        }
     else:
-        return pd.Series(
-            {
-                "full_address": None,
-                "postal_code": None,
-                "latitude": None,
-                "longitude": None,
-                "importance": None,
-                "place_id": None,
-            }
-        )
+        return dict.fromkeys(GEOCODE_COLUMNS)
 
 
 async def get_geocode_details_batch(df: pd.DataFrame) -> pd.DataFrame:
@@ -74,28 +97,35 @@ async def get_geocode_details_batch(df: pd.DataFrame) -> pd.DataFrame:
         user_agent="idealista-scraper", adapter_factory=AioHTTPAdapter, timeout=10
     ) as geolocator:
         geocode = AsyncRateLimiter(geolocator.geocode, min_delay_seconds=1)
+
+        async def geocode_row(i, address1, address2):
+            return i, await get_geocode_details(address1, address2, geocode)
+
+        # Geocode addresses concurrently. The rate limiter still starts at most one
+        # request per second, but their network latency now overlaps.
+        rows = list(df[["ADDRESS", "LOCATION"]].itertuples(index=False, name=None))
+        # Repeated addresses in the batch are only geocoded once
+        unique_rows = list(dict.fromkeys(rows))
         geo_tasks = [
-            get_geocode_details(row["ADDRESS"], row["LOCATION"], geocode)
-            for _, row in df.iterrows()
+            asyncio.create_task(geocode_row(i, address1, address2))
+            for i, (address1, address2) in enumerate(unique_rows)
         ]
-        results = []
-        # Geocode addresses asynchronously
-        for geo_task in tqdm(
-            geo_tasks, total=df.shape[0], desc="Geocoding...", ncols=100
-        ):
-            result = await geo_task
-            results.append(result)
+        unique_results = [None] * len(geo_tasks)
+        try:
+            for geo_task in tqdm(
+                asyncio.as_completed(geo_tasks),
+                total=len(geo_tasks),
+                desc="Geocoding...",
+                ncols=100,
+            ):
+                i, result = await geo_task
+                unique_results[i] = result
+        finally:
+            for geo_task in geo_tasks:
+                geo_task.cancel()
+        results_by_row = dict(zip(unique_rows, unique_results))
+        results = [results_by_row[row] for row in rows]
 
-    df_out = pd.DataFrame()
-    df_out[
-        [
-            "FULL_ADDRESS",
-            "ZIP_CODE",
-            "LATITUDE",
-            "LONGITUDE",
-            "IMPORTANCE_LOCATION",
-            "LOCATION_ID",
-        ]
-    ] = pd.DataFrame(results)
+    df_out = pd.DataFrame.from_records(results, columns=list(GEOCODE_COLUMNS))
 
-    return df_out
+    return df_out.rename(columns=GEOCODE_COLUMNS)
@@ -1,8 +1,9 @@
+import asyncio
 import re
-from typing import Any, Dict, List
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
-from prefect import task
+import pyarrow as pa
 
 from src.data_processing.feature_parser import (
     split_amenity_features,
@@ -11,92 +12,107 @@ from src.data_processing.feature_parser import (
     split_energy_features,
 )
 from src.data_processing.geocoding import get_geocode_details_batch
-from src.data_processing.utils import parse_date_in_column, process_features
+from src.data_processing.utils import process_features
+from src.orchestration import task
+
+# Listing ID in property URLs like https://www.idealista.com/inmueble/94481996/
+LISTING_ID_PATTERN = re.compile(r"/(\d+)")
+# Split function by listing feature column
+FEATURE_COLUMNS = {
+    "features_Características básicas": split_basic_features,
+    "features_Edificio": split_building_features,
+    "features_Equipamiento": split_amenity_features,
+    "features_Certificado energético": split_energy_features,
+}
+
+
+def _process_listing_features(df: pd.DataFrame) -> list:
+    """Split every listing feature column of the scraped data, one thread each."""
+    with ThreadPoolExecutor(max_workers=len(FEATURE_COLUMNS)) as executor:
+        return list(
+            executor.map(
+                lambda item: process_features(df, *item), FEATURE_COLUMNS.items()
+            )
+        )
 
 
 async def _clean_scraped_data(
-    property_data: List[Dict[str, Any]], type_search: str
+    property_data: pa.Table, type_search: str
 ) -> pd.DataFrame:
     """
     Clean the data from the scraped properties.
 
     Args:
-        property_data (List[Dict[str, Any]]): The scraped property data to clean.
+        property_data (pa.Table): The scraped property data to clean.
         type_search (str): The type of search ("sale" or "rent").
 
     Returns:
         pd.DataFrame: The cleaned property data.
     """
     print("Cleaning data...")
-    df = pd.DataFrame(property_data)
+    df = property_data.to_pandas()
+    # Feature parsers expect list columns as Python lists, not NumPy arrays
+    for field in property_data.schema:
+        if pa.types.is_list(field.type):
+            df[field.name] = property_data.column(field.name).to_pylist()
 
+    # Columns are collected first and the output frame is built once at the end
+    columns = {}
     # Get ID from URL
-    df_out = pd.DataFrame()
-    df_out["ID_LISTING"] = df["url"].apply(lambda x: re.findall(r"\d+", x)[0])
-    df_out["URL"] = df["url"]
+    columns["ID_LISTING"] = df["url"].str.extract(LISTING_ID_PATTERN, expand=False)
+    columns["URL"] = df["url"]
     # Get type of property and address from title and location
     if type_search == "sale":
         pattern = r"(.*) en venta en (.*)"
     else:
         pattern = r"Alquiler de (.*) en (.*)"
-    df_match = df["title"].str.extract(pattern).applymap(lambda x: x.strip())
-    df_out["TYPE_PROPERTY"] = df_match[0]
-    df_out["ADDRESS"] = df_match[1] + ", " + df["location"]
+    df_match = df["title"].str.extract(pattern)
+    df_match = df_match.apply(lambda column: column.str.strip())
+    columns["TYPE_PROPERTY"] = df_match[0]
+    columns["ADDRESS"] = df_match[1] + ", " + df["location"]
     # Get ZIP code based on address and location
-    df_out["LOCATION"] = df["location"]
-    df_geocode_details = await get_geocode_details_batch(df_out)
-    df_out = pd.concat([df_out, df_geocode_details], axis=1)
+    columns["LOCATION"] = df["location"]
+    # Split listing features in the background while the addresses are geocoded
+    features_task = asyncio.create_task(
+        asyncio.to_thread(_process_listing_features, df)
+    )
+    try:
+        df_geocode_details = await get_geocode_details_batch(
+            pd.DataFrame(
+                {"ADDRESS": columns["ADDRESS"], "LOCATION": columns["LOCATION"]}
+            )
+        )
+    except BaseException:
+        features_task.cancel()
+        raise
+    columns.update(df_geocode_details.items())
     # Get price and currency
-    df_out["PRICE"] = df["price"]
-    df_out["ORIGINAL_PRICE"] = df["original_price"]
-    df_out["CURRENCY"] = df["currency"]
+    columns["PRICE"] = df["price"]
+    columns["ORIGINAL_PRICE"] = df["original_price"]
+    columns["CURRENCY"] = df["currency"]
     # Get post tags
-    df_out["TAGS"] = df["tags"].astype(str)
+    columns["TAGS"] = df["tags"].astype(str)
     # Get listing description
-    df_out["LISTING_DESCRIPTION"] = df["description"]
+    columns["LISTING_DESCRIPTION"] = df["description"]
     # Get poster details
-    df_out["POSTER_TYPE"] = df["poster_type"]
-    df_out["POSTER_NAME"] = df["poster_name"]
-    # Get basic listing features
-    df_basic_features = process_features(
-        df, "features_Características básicas", split_basic_features
-    )
-    # Get building listing features
-    df_building_features = process_features(
-        df, "features_Edificio", split_building_features
-    )
-    # Get amenities listing features
-    df_amenities_features = process_features(
-        df, "features_Equipamiento", split_amenity_features
-    )
-    # Get energy listing features
-    df_energy_features = process_features(
-        df, "features_Certificado energético", split_energy_features
-    )
-    # Concatenate all features
-    df_out = pd.concat(
-        [
-            df_out,
-            df_basic_features,
-            df_building_features,
-            df_amenities_features,
-            df_energy_features,
-        ],
-        axis=1,
-    )
+    columns["POSTER_TYPE"] = df["poster_type"]
+    columns["POSTER_NAME"] = df["poster_name"]
+    # Add all features
+    for df_features in await features_task:
+        columns.update(df_features.items())
     # Get last update date and timestamp
-    df_out["LAST_UPDATE_DATE"] = df["updated"].apply(parse_date_in_column)
-    df_out["TIMESTAMP"] = pd.to_datetime(df["time_stamp"])
+    columns["LAST_UPDATE_DATE"] = df["updated"]
+    columns["TIMESTAMP"] = pd.to_datetime(df["time_stamp"])
     # TODO: Get columns related to photos of the listing - might be useful for future analysis
     # image_cols = [col for col in df.columns if col.startswith('image')]
     # df_out[image_cols] = df[image_cols]
 
-    return df_out
+    return pd.DataFrame(columns)
 
 
 @task(retries=3, log_prints=True)
 async def clean_scraped_data(
-    property_data: List[Dict[str, Any]], type_search: str
+    property_data: pa.Table, type_search: str
 ) -> pd.DataFrame:
     """
     Task to clean the data from the scraped properties.
@@ -105,7 +121,7 @@ async def clean_scraped_data(
     It is designed to be used in a Prefect flow and will retry 3 times if it fails.
 
     Args:
-        property_data (List[Dict[str, Any]]): The scraped property data to clean.
+        property_data (pa.Table): The scraped property data to clean.
         type_search (str): The type of search ("sale" or "rent").
 
     Returns:
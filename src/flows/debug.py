@@ -1,12 +1,11 @@
 import asyncio
-from dataclasses import asdict
 
 from src.data_processing.tasks import _clean_scraped_data
 from src.repositories.gcp.bigquery import _load_data_from_gcs_to_bigquery
 from src.repositories.gcp.parquet import _prepare_parquet_file
 from src.repositories.gcp.storage import _save_and_upload_to_gcs
 from src.scrapers.idealista_scraper import IdealistaScraper
-from src.scrapers.utils import flatten_dict
+from src.scrapers.utils import properties_to_table
 
 
 async def debug_properties(
@@ -17,8 +16,8 @@ async def debug_properties(
 
     try:
         async with IdealistaScraper() as scraper:
-            scraped_property = await scraper.scrape_properties(urls)
-        property_data = [flatten_dict(asdict(item)) for item in scraped_property]
+            scraped_property, _ = await scraper.scrape_properties(urls)
+        property_data = properties_to_table(scraped_property)
         cleaned_property_data = await _clean_scraped_data(property_data, type_search)
         pa_cleaned_property_data = _prepare_parquet_file(
             cleaned_property_data, type_search
@@ -1,17 +1,42 @@
 import asyncio
-import math
+import os
 import random
 import time
-
-from prefect import flow
+from contextlib import aclosing
+from datetime import datetime
 
 from src.data_processing.tasks import clean_scraped_data
-from src.flows.utils import chunks
+from src.flows.utils import achunks, chunks
+from src.orchestration import flow
 from src.repositories.gcp.bigquery import load_data_from_gcs_to_bigquery
-from src.repositories.gcp.parquet import prepare_parquet_file
-from src.repositories.gcp.storage import save_and_upload_to_gcs
+from src.repositories.gcp.parquet import ParquetBatchWriter, prepare_parquet_file
+from src.repositories.gcp.storage import upload_buffer_to_gcs
+from src.repositories.local.seen_urls import (
+    get_seen_urls_db_path,
+    load_seen_urls,
+    mark_urls_as_seen,
+)
+from src.scrapers.idealista_scraper import IdealistaScraper
 from src.scrapers.tasks import scrape_properties_task, scrape_search_task
 
+BASE_URL = "https://www.idealista.com"
+TYPE_SEARCH_URLS = {
+    "sale": "venta-viviendas",
+    "rent": "alquiler-viviendas",
+    "share": "alquiler-habitacion",
+}
+TIME_PERIOD_URLS = {
+    "24": "ultimas-24-horas",
+    "48": "ultimas-48-horas",
+    "week": "ultima-semana",
+    "month": "ultimo-mes",
+}
+# Bounds of the batch size when it is adapted to the observed scraping speed
+MIN_BATCH_SIZE = 5
+MAX_BATCH_SIZE = 100
+# Progress is printed once every this many batches
+LOG_EVERY_N_BATCHES = 10
+
 
 @flow(log_prints=True)
 async def idealista_to_gcp_pipeline(
@@ -23,7 +48,10 @@ async def idealista_to_gcp_pipeline(
     credentials_path: str,
     zone: str = None,
     batch_size: int = 30,
+    target_batch_time: int = 15 * 60,
     max_execution_time: int = 18 * 60 * 60,
+    concurrency: int = 16,
+    parallel_batches: int = 2,
     testing: bool = False,
 ):
     """
@@ -43,24 +71,29 @@ async def idealista_to_gcp_pipeline(
         credentials_path: The path to the GCS credentials
         zone: The zone to search in the province. These zones are defined in
         the idealista website. (default None = search in the whole province)
-        batch_size: The number of properties to scrape before uploading to GCS
-        (default 30)
+        batch_size: The number of properties in the first batch. Next batches are
+        resized given the observed scraping speed (default 30)
+        target_batch_time: The time in seconds that a batch should take to scrape
+        (default 15 minutes)
         max_execution_time: The maximum time to run the pipeline in seconds
         (default 18 hours)
+        concurrency: The maximum number of in-flight requests to idealista. The
+        request rate is still bounded by the scraper rate limiter (default 16)
+        parallel_batches: The number of batches scraped at the same time (default 2)
         testing: Whether to run the pipeline in testing mode (default False)
     """
-    BASE_URL = "https://www.idealista.com"
-    TYPE_SEARCH_URLS = {
-        "sale": "venta-viviendas",
-        "rent": "alquiler-viviendas",
-        "share": "alquiler-habitacion",
-    }
-    TIME_PERIOD_URLS = {
-        "24": "ultimas-24-horas",
-        "48": "ultimas-48-horas",
-        "week": "ultima-semana",
-        "month": "ultimo-mes",
-    }
+    if type_search not in TYPE_SEARCH_URLS:
+        raise ValueError(
+            f"Invalid type_search '{type_search}'. "
+            f"Expected one of {list(TYPE_SEARCH_URLS)}"
+        )
+    if time_period not in TIME_PERIOD_URLS:
+        raise ValueError(
+            f"Invalid time_period '{time_period}'. "
+            f"Expected one of {list(TIME_PERIOD_URLS)}"
+        )
+    if parallel_batches < 1:
+        raise ValueError(f"parallel_batches must be at least 1, got {parallel_batches}")
 
     # Generate search URL
     location_url = (
@@ -83,45 +116,259 @@ async def idealista_to_gcp_pipeline(
         print(f"Random delay: {sleeping_time / 60:.2f} minutes")
         await asyncio.sleep(sleeping_time)
 
+    # Skip properties already loaded into BigQuery by previous runs
+    seen_urls_db = get_seen_urls_db_path(credentials_path)
+    seen_urls = await asyncio.to_thread(load_seen_urls, seen_urls_db, table_id)
+    print(f"Found {len(seen_urls)} properties already scraped in previous runs")
+
     start_time = time.time()
+    # Files uploaded during this run are named after the time it started, so that
+    # a rerun on the same day neither overwrites them nor loads them again
+    run_id = datetime.now().strftime("%Y-%m-%d_%H%M%S")
 
-    # Scrape and process property URLs
-    property_urls = await scrape_search_task(url, paginate=not testing)
-    n_batches = math.ceil(len(property_urls) / batch_size)
-    processed_properties = 0
-    for i, property_urls_batch in enumerate(chunks(property_urls, batch_size)):
-        if time.time() - start_time > max_execution_time:  # 18 hours
-            print("Max execution time reached. Stopping the scraping process.")
-            break
+    # Scrape and process property URLs reusing the same scraper (and its
+    # connection pool) for the search and all the batches
+    async with IdealistaScraper(concurrency=concurrency) as scraper:
+        found_properties = 0
+        processed_properties = 0
+        failed = False
 
-        print(f"Processing batch {i + 1} out of {n_batches}")
-        property_data = await scrape_properties_task(property_urls_batch)
+        # Scraping, cleaning and writing run as concurrent stages connected by
+        # bounded queues, so the next batch is scraped while the previous one is
+        # being processed. A `None` item signals the end of the stream.
+        scraped_q = asyncio.Queue(maxsize=2)
+        cleaned_q = asyncio.Queue(maxsize=2)
+        pending_batches = {}
+        retry_urls = []
+        n_batches = 0
+        seconds_per_property = None
 
-        if not property_data:
-            continue
+        async def put_scraped(return_when):
+            # Hand completed batches over to the cleaning stage
+            nonlocal seconds_per_property
+            done, _ = await asyncio.wait(pending_batches, return_when=return_when)
+            for batch in done:
+                i, batch_start, n_urls = pending_batches.pop(batch)
+                property_data, failed_urls = batch.result()
+                # Exponentially weighted moving average of the scraping speed
+                batch_speed = (time.time() - batch_start) / n_urls
+                if seconds_per_property is None:
+                    seconds_per_property = batch_speed
+                else:
+                    seconds_per_property = (
+                        0.7 * seconds_per_property + 0.3 * batch_speed
+                    )
+                retry_urls.extend(failed_urls)
+                if property_data.num_rows:
+                    await scraped_q.put((i, property_data))
 
-        try:
-            cleaned_property_data = await clean_scraped_data(property_data, type_search)
-            pa_cleaned_property_data = prepare_parquet_file(
-                cleaned_property_data, type_search
-            )
-            parquet_file_path = save_and_upload_to_gcs(
-                pa_cleaned_property_data, bucket_name, to_path, credentials_path, i
+        def next_batch_size():
+            # Size batches so they take about target_batch_time, and never more
+            # than the remaining execution time
+            if seconds_per_property is None:
+                return batch_size
+            remaining_time = max_execution_time - (time.time() - start_time)
+            batch_time = min(target_batch_time, remaining_time)
+            size = int(batch_time / max(seconds_per_property, 1e-3))
+            return max(MIN_BATCH_SIZE, min(MAX_BATCH_SIZE, size))
+
+        def should_stop():
+            if failed:
+                return True
+            if time.time() - start_time > max_execution_time:  # 18 hours
+                print("Max execution time reached. Stopping the scraping process.")
+                return True
+            return False
+
+        async def schedule_batch(property_urls_batch):
+            nonlocal n_batches
+            # Several batches are scraped at once so that a slow property doesn't
+            # leave the request slots idle
+            if len(pending_batches) >= parallel_batches:
+                await put_scraped(asyncio.FIRST_COMPLETED)
+            if n_batches % LOG_EVERY_N_BATCHES == 0:
+                print(f"Processing batch {n_batches + 1}")
+            batch = asyncio.create_task(
+                scrape_properties_task(scraper, property_urls_batch)
             )
-            load_data_from_gcs_to_bigquery(
-                bucket_name, parquet_file_path, dataset_id, table_id, credentials_path
+            pending_batches[batch] = (n_batches, time.time(), len(property_urls_batch))
+            n_batches += 1
+
+        async def scrape_stage():
+            nonlocal found_properties
+            # Property URLs are streamed from the search, so the first batches
+            # are scraped while the remaining search pages are still being fetched
+            search_urls = scrape_search_task(scraper, url, paginate=not testing)
+            new_urls = (u async for u in search_urls if u not in seen_urls)
+            try:
+                stopped = False
+                async with aclosing(achunks(new_urls, next_batch_size)) as batches:
+                    async for property_urls_batch in batches:
+                        if stopped := should_stop():
+                            break
+                        found_properties += len(property_urls_batch)
+                        await schedule_batch(property_urls_batch)
+                if pending_batches:
+                    await put_scraped(asyncio.ALL_COMPLETED)
+
+                # Give the properties whose request failed a second chance, once
+                # the rest of the search has been scraped
+                failed_urls = retry_urls.copy()
+                retry_urls.clear()
+                if failed_urls and not stopped:
+                    print(f"Retrying {len(failed_urls)} properties that failed")
+                    for property_urls_batch in chunks(failed_urls, next_batch_size()):
+                        if should_stop():
+                            break
+                        await schedule_batch(property_urls_batch)
+                    if pending_batches:
+                        await put_scraped(asyncio.ALL_COMPLETED)
+                if retry_urls:
+                    print(f"Failed to scrape {len(retry_urls)} properties")
+            finally:
+                for batch in pending_batches:
+                    batch.cancel()
+                await search_urls.aclose()
+                await scraped_q.put(None)
+
+        async def clean_stage():
+            nonlocal failed
+            while (item := await scraped_q.get()) is not None:
+                i, property_data = item
+                if failed:
+                    continue
+                try:
+                    cleaned_property_data = await clean_scraped_data(
+                        property_data, type_search
+                    )
+                    await cleaned_q.put((i, cleaned_property_data))
+                except Exception as e:
+                    print(f"Error processing batch {i}: {e}")
+                    failed = True
+            await cleaned_q.put(None)
+
+        async def upload_file(parquet_file, file_number, urls):
+            nonlocal failed, uploaded_files
+            try:
+                await asyncio.to_thread(
+                    upload_buffer_to_gcs,
+                    parquet_file,
+                    bucket_name,
+                    to_path,
+                    credentials_path,
+                    f"{run_id}_{file_number}.parquet",
+                )
+            except Exception as e:
+                print(f"Error uploading file {file_number}: {e}")
+                failed = True
+                raise
+            uploaded_files += 1
+            written_urls.extend(urls)
+
+        def schedule_upload(parquet_file):
+            # Upload in the background so that the next batches keep flowing. The
+            # file holds every URL written since the previous file was closed.
+            urls = buffered_urls.copy()
+            buffered_urls.clear()
+            upload_tasks.append(
+                asyncio.create_task(upload_file(parquet_file, len(upload_tasks), urls))
             )
-        except Exception as e:
-            print(f"Error processing batch {i}: {e}")
-            break
 
-        processed_properties += len(property_data)
-        print(f"Processed {processed_properties} properties")
+        async def write_table(table, urls):
+            parquet_file = await asyncio.to_thread(parquet_writer.write, table)
+            buffered_urls.extend(urls)
+            if parquet_file is not None:
+                schedule_upload(parquet_file)
+
+        async def upload_stage():
+            nonlocal failed, processed_properties
+            processed_batches = 0
+            while (item := await cleaned_q.get()) is not None:
+                i, cleaned_property_data = item
+                if failed:
+                    continue
+                try:
+                    # PyArrow conversion and writes are synchronous
+                    pa_cleaned_property_data = await asyncio.to_thread(
+                        prepare_parquet_file, cleaned_property_data, type_search
+                    )
+                    # A write can't be interrupted halfway through its thread, so
+                    # it is shielded and awaited again before closing the writer
+                    write = asyncio.create_task(
+                        write_table(
+                            pa_cleaned_property_data, cleaned_property_data["URL"]
+                        )
+                    )
+                    pending_writes.append(write)
+                    await asyncio.shield(write)
+                except Exception as e:
+                    print(f"Error processing batch {i}: {e}")
+                    failed = True
+                    continue
+
+                processed_properties += len(cleaned_property_data)
+                processed_batches += 1
+                if processed_batches % LOG_EVERY_N_BATCHES == 0:
+                    print(
+                        f"Processed {processed_properties} properties in "
+                        f"{processed_batches} batches"
+                    )
+
+        # Batches are appended as row groups of in-memory Parquet files, which are
+        # uploaded to GCS every half an hour (or as they fill up) and loaded into
+        # BigQuery at the end
+        parquet_writer = ParquetBatchWriter()
+        pending_writes = []
+        upload_tasks = []
+        uploaded_files = 0
+        # URLs written to the current Parquet file, and URLs of uploaded files
+        buffered_urls = []
+        written_urls = []
+        stages = [
+            asyncio.create_task(stage())
+            for stage in (scrape_stage, clean_stage, upload_stage)
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            # If a stage failed the others are stopped, so that nothing writes to
+            # the Parquet writer while it is closed
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            await asyncio.gather(*pending_writes, return_exceptions=True)
+            try:
+                # Closing flushes the buffered row group, which can be large
+                parquet_file = await asyncio.to_thread(parquet_writer.close)
+                if parquet_file is not None:
+                    schedule_upload(parquet_file)
+            finally:
+                uploads = await asyncio.gather(*upload_tasks, return_exceptions=True)
+                # Files uploaded before a failure are loaded too, so that a failed
+                # run doesn't leave them orphaned in GCS. The error is raised after.
+                if uploaded_files:
+                    # Load every file of this run in a single BigQuery job
+                    await asyncio.to_thread(
+                        load_data_from_gcs_to_bigquery,
+                        bucket_name,
+                        os.path.join(to_path, f"{run_id}_*.parquet"),
+                        dataset_id,
+                        table_id,
+                        credentials_path,
+                    )
+                    await asyncio.to_thread(
+                        mark_urls_as_seen, seen_urls_db, table_id, written_urls
+                    )
+                for upload in uploads:
+                    if isinstance(upload, Exception):
+                        raise upload
 
     elapsed_time = int(time.time() - start_time)
-    pcg_properties = (processed_properties / len(property_urls)) * 100
+    pcg_properties = (
+        processed_properties / found_properties * 100 if found_properties else 0
+    )
     print(
-        f"Scraped {processed_properties}/{len(property_urls)} "
+        f"Scraped {processed_properties}/{found_properties} "
         f"({pcg_properties:.2f}% of properties) in {elapsed_time//3600} hours, "
         f"{(elapsed_time%3600)//60} minutes, and {elapsed_time%60} seconds"
     )
@@ -1,7 +1,36 @@
-from typing import List
+from itertools import islice
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Union,
+)
 
 
-def chunks(lst: List[str], n: int) -> List[str]:
-    """Yield successive n-sized chunks from lst."""
-    for i in range(0, len(lst), n):
-        yield lst[i : i + n]
+def chunks(iterable: Iterable[str], n: int) -> Iterator[List[str]]:
+    """Yield successive n-sized chunks from an iterable."""
+    it = iter(iterable)
+    return iter(lambda: list(islice(it, n)), [])
+
+
+async def achunks(
+    aiterable: AsyncIterable[str], n: Union[int, Callable[[], int]]
+) -> AsyncIterator[List[str]]:
+    """Yield successive chunks from an async iterable.
+
+    n is either the size of every chunk or a function returning the size of the
+    next chunk, so that it can change while the iterable is consumed.
+    """
+    chunk = []
+    size = n() if callable(n) else n
+    async for item in aiterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+            size = n() if callable(n) else n
+    if chunk:
+        yield chunk
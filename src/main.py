@@ -10,6 +10,19 @@ if project_root not in sys.path:
 
 
 if __name__ == "__main__":
+    # uvloop is faster than the default event loop but it is not available on
+    # Windows, nor always on the newest Python versions. Fall back to asyncio's loop.
+    # uvloop.run creates its loop directly, since installing a global event loop
+    # policy is deprecated from Python 3.12.
+    run = asyncio.run
+    if sys.platform != "win32":
+        try:
+            import uvloop
+
+            run = uvloop.run
+        except ImportError:
+            pass
+
     zone = "madrid"
     province = "madrid"
     type_search = "rent"
@@ -17,7 +30,7 @@ if __name__ == "__main__":
     bucket_name = "idealista_data_lake_idealista-scraper-384619"
     dataset_id = "idealista_listings"
     credentials_path = "~/.gcp/prefect-agent.json"
-    asyncio.run(
+    run(
         idealista_to_gcp_pipeline(
             province,
             type_search,
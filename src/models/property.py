@@ -1,8 +1,9 @@
 from dataclasses import dataclass
+from datetime import date
 from typing import Dict, List, Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class Property:
     """A dataclass representing the result of scraping an Idealista.com property page"""
 
@@ -19,5 +20,5 @@ class Property:
     features: Dict[str, List[str]]
     images: Dict[str, List[str]]
     plans: List[str]
-    updated: str
+    updated: Optional[date]
     time_stamp: str
@@ -0,0 +1,17 @@
+import os
+
+import prefect
+
+# Local and testing runs can skip the Prefect runtime (task runs, state
+# persistence and API calls) by setting NO_PREFECT=1. The decorators then
+# return the decorated functions unchanged.
+NO_PREFECT = os.environ.get("NO_PREFECT", "").lower() in ("1", "true", "yes")
+
+
+def _passthrough(**kwargs):
+    """Decorator factory that ignores the Prefect options and returns the function."""
+    return lambda fn: fn
+
+
+task = _passthrough if NO_PREFECT else prefect.task
+flow = _passthrough if NO_PREFECT else prefect.flow
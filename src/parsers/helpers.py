@@ -1,39 +1,111 @@
-import json
 import re
 from collections import defaultdict
-from typing import Any, Dict, List
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urljoin
 
-from bs4 import BeautifulSoup
+import orjson
+from selectolax.lexbor import LexborHTMLParser, LexborNode
+
+# Patterns used on every property page, compiled once
+GALLERY_PATTERN = re.compile(r"fullScreenGalleryPics\s*:\s*(\[.+?\]),")
+UNQUOTED_KEY_PATTERN = re.compile(r"(\w+?):([^/])")
+# Spanish month names, so dates can be parsed without switching the process locale
+SPANISH_MONTHS = {
+    "enero": 1,
+    "febrero": 2,
+    "marzo": 3,
+    "abril": 4,
+    "mayo": 5,
+    "junio": 6,
+    "julio": 7,
+    "agosto": 8,
+    "septiembre": 9,
+    "octubre": 10,
+    "noviembre": 11,
+    "diciembre": 12,
+}
+
+
+def join_url(base_url: str, href: str) -> str:
+    """
+    Resolve a link against the site base URL, without urljoin when possible
 
+    Args:
+        base_url: The scheme and host of the site, without a trailing slash
+        href: The link to resolve
 
-def get_features(soup: BeautifulSoup) -> Dict[str, List[str]]:
+    Returns:
+        The absolute URL of the link
+    """
+    if href.startswith(("https://", "http://")):
+        return href
+    if href.startswith("/") and not href.startswith("//"):
+        return base_url + href
+    return urljoin(base_url, href)
+
+
+def parse_spanish_date(date_string: str) -> date:
+    """
+    Parse a spanish date without year, such as '12 de mayo', in the current year
+
+    Args:
+        date_string: The day and month name separated by ' de '
+
+    Returns:
+        The parsed date
+
+    Raises:
+        ValueError: If the string is not a day and a month separated by ' de '
+        KeyError: If the month name is unknown
+    """
+    day, month = date_string.split(" de ")
+    month = SPANISH_MONTHS[month.strip().lower()]
+    return date(date.today().year, month, int(day))
+
+
+def get_next_element(node: LexborNode, tag: str) -> Optional[LexborNode]:
+    """
+    Get the next sibling element of a node with a given tag
+
+    Args:
+        node: The node to start searching from
+        tag: The tag of the element to find
+
+    Returns:
+        The next sibling element with the given tag, or None if there is none
+    """
+    sibling = node.next
+    while sibling is not None and sibling.tag != tag:
+        sibling = sibling.next
+    return sibling
+
+
+def get_features(tree: LexborHTMLParser) -> Dict[str, List[str]]:
     """
     Extract property features from an Idealista.com property page
 
     Args:
-        soup: The BeautifulSoup object representing the parsed HTML of the
-        property page
+        tree: The parsed HTML of the property page
 
     Returns:
         A dictionary of property features, where each key is a feature category
         and each value is a list of features in that category
     """
     feature_dict = {}
-    for feature_block in soup.select('[class^="details-property-h"]'):
-        feature_name = feature_block.text.strip()
+    for feature_block in tree.css('[class^="details-property-h"]'):
+        feature_name = feature_block.text().strip()
+        feature_list = get_next_element(feature_block, "div")
+        feature_items = feature_list.css("li") if feature_list is not None else []
         if feature_name != "Certificado energético":
-            features = [
-                feat.text.strip()
-                for feat in feature_block.find_next("div").select("li")
-            ]
+            features = [feat.text().strip() for feat in feature_items]
         else:
             features = []
-            for feat in feature_block.find_next("div").select("li"):
-                feat_props = feat.find_all("span")
-                type_certificate = feat_props[0].text.strip()
-                kwh_m2 = feat_props[1].text.strip()
-                energy_label = feat_props[1]["title"].upper()
+            for feat in feature_items:
+                feat_props = feat.css("span")
+                type_certificate = feat_props[0].text().strip()
+                kwh_m2 = feat_props[1].text().strip()
+                energy_label = feat_props[1].attributes["title"].upper()
                 energy_feat = f"{type_certificate} {kwh_m2} {energy_label}"
                 features.append(energy_feat.strip())
 
@@ -41,64 +113,59 @@ def get_features(soup: BeautifulSoup) -> Dict[str, List[str]]:
     return feature_dict
 
 
-def get_image_data(soup: BeautifulSoup) -> List[Dict[str, Any]]:
+def get_image_data(tree: LexborHTMLParser) -> List[Dict[str, Any]]:
     """
     Extract image data from an Idealista.com property page
 
     Args:
-        soup: The BeautifulSoup object representing the parsed HTML of the
-        property page
+        tree: The parsed HTML of the property page
 
     Returns:
         A list of dictionaries representing each image, with keys for the image
         URL, caption, and other metadata
     """
-    script = soup.find("script", string=re.compile("fullScreenGalleryPics"))
+    # The text of each script is built once, the gallery script is a large one
+    script = next(
+        (
+            text
+            for text in (node.text() for node in tree.css("script"))
+            if "fullScreenGalleryPics" in text
+        ),
+        None,
+    )
     if script is None:
         return []
-    match = re.search(r"fullScreenGalleryPics\s*:\s*(\[.+?\]),", script.string)
+    match = GALLERY_PATTERN.search(script)
     if match is None:
         return []
-    image_data = json.loads(re.sub(r"(\w+?):([^/])", r'"\1":\2', match.group(1)))
+    image_data = orjson.loads(UNQUOTED_KEY_PATTERN.sub(r'"\1":\2', match.group(1)))
     return image_data
 
 
-def get_images(base_url, image_data: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+def split_images(
+    base_url, image_data: List[Dict[str, Any]]
+) -> Tuple[Dict[str, List[str]], List[str]]:
     """
-    Extract image URLs from a list of image data dictionaries
+    Split a list of image data dictionaries into image and plan URLs
 
     Args:
+        base_url: The base URL to resolve relative image URLs against
         image_data: A list of dictionaries representing each image, with keys
         for the image URL, caption, and other metadata
 
     Returns:
-        A dictionary of image URLs, where each key is an image category and
-        each value is a list of image URLs in that category
+        A tuple with a dictionary of image URLs, where each key is an image category
+        and each value is a list of image URLs in that category, and a list of plan
+        image URLs
     """
     image_dict = defaultdict(list)
+    plan_urls = []
     for image in image_data:
-        url = urljoin(base_url, image["imageUrl"])
+        url = join_url(base_url, image["imageUrl"])
         if image["isPlan"]:
-            continue
-        if image["tag"] is None:
+            plan_urls.append(url)
+        elif image["tag"] is None:
             image_dict["main"].append(url)
         else:
             image_dict[image["tag"]].append(url)
-    return dict(image_dict)
-
-
-def get_plans(base_url, image_data: List[Dict[str, Any]]) -> List[str]:
-    """
-    Extract plan image URLs from a list of image data dictionaries
-
-    Args:
-        image_data: A list of dictionaries representing each image, with keys
-        for the image URL, caption, and other metadata
-
-    Returns:
-        A list of plan image URLs
-    """
-    plan_urls = [
-        urljoin(base_url, image["imageUrl"]) for image in image_data if image["isPlan"]
-    ]
-    return plan_urls
+    return dict(image_dict), plan_urls
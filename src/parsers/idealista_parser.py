@@ -1,14 +1,24 @@
 import math
 import re
 from datetime import datetime
-from urllib.parse import urljoin
+from functools import cached_property
 
 import httpx
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 
 from src.models.property import Property
 from src.parsers.base_parser import BaseParser
-from src.parsers.helpers import get_features, get_image_data, get_images, get_plans
+from src.parsers.helpers import (
+    get_features,
+    get_image_data,
+    join_url,
+    parse_spanish_date,
+    split_images,
+)
+
+TOTAL_RESULTS_PATTERN = re.compile(r"([0-9.,]+)\s*(?:casas|anuncios)")
+# Removes thousands separators from numbers in a single pass
+THOUSANDS_SEPARATORS = str.maketrans("", "", ".,")
 
 
 class IdealistaParser(BaseParser):
@@ -28,6 +38,12 @@ class IdealistaParser(BaseParser):
         self.num_results_page = num_results_page
         self.base_url = base_url
 
+    @cached_property
+    def tree(self) -> LexborHTMLParser:
+        """The parsed HTML of the response, shared by all the parsing methods."""
+        # Lexbor decodes the raw bytes itself, so the text is never built in Python
+        return LexborHTMLParser(self.response.content)
+
     def parse_search(self) -> list:
         """
         Parse an Idealista search results page to extract property URLs.
@@ -35,10 +51,9 @@ class IdealistaParser(BaseParser):
         Returns:
             list: A list of property URLs found in the search results.
         """
-        soup = BeautifulSoup(self.response.text, "html.parser")
         urls = [
-            urljoin(str(self.response.url), a["href"])
-            for a in soup.select("article.item .item-link")
+            join_url(self.base_url, a.attributes["href"])
+            for a in self.tree.css("article.item .item-link")
         ]
         return urls
 
@@ -49,60 +64,67 @@ class IdealistaParser(BaseParser):
         Returns:
             dict: A dictionary containing the parsed property details.
         """
-        soup = BeautifulSoup(self.response.text, "html.parser")
+        tree = self.tree
 
         # Extracting general details
         url = str(self.response.url)
-        title = soup.select_one(".main-info__title-main").text.strip()
-        location = soup.select_one(".main-info__title-minor").text.strip()
-        currency = soup.select_one(".info-data-price").contents[-1].strip()
+        title = tree.css_first(".main-info__title-main").text().strip()
+        location = tree.css_first(".main-info__title-minor").text().strip()
+        price_node = tree.css_first(".info-data-price")
+        price_info = list(price_node.iter(include_text=True))
+        currency = price_info[-1].text().strip()
 
         # Extracting price details
-        price_element = soup.select_one(".info-data-price span")
+        price_element = price_node.css_first("span")
         price = (
-            int(price_element.text.replace(".", "").replace(",", ""))
+            int(price_element.text().translate(THOUSANDS_SEPARATORS))
             if price_element
             else None
         )
-        original_price_element = soup.select_one(".pricedown_price span")
+        original_price_element = tree.css_first(".pricedown_price span")
         original_price = (
-            int(original_price_element.text.strip().replace(".", "").replace(",", ""))
+            int(original_price_element.text().translate(THOUSANDS_SEPARATORS))
             if original_price_element
             else None
         )
 
         # Tags
-        tags = (
-            soup.select_one(".detail-info-tags").text.split()
-            if soup.select_one(".detail-info-tags")
-            else None
-        )
+        tags_element = tree.css_first(".detail-info-tags")
+        tags = tags_element.text().split() if tags_element else None
 
         # Extracting post description
-        description = "\n".join([p.text.strip() for p in soup.select("div.comment p")])
+        description = "\n".join([p.text().strip() for p in tree.css("div.comment p")])
 
         # Poster details
-        check_professional = soup.select_one(
+        check_professional = tree.css_first(
             ".advertiser-name-container .about-advertiser-name"
         )
         if check_professional:
             poster_type = "Profesional"
-            poster_name = check_professional.text.strip()
+            poster_name = check_professional.text().strip()
         else:
             poster_type = "Particular"
-            poster_name_element = soup.select_one(".professional-name span")
+            poster_name_element = tree.css_first(".professional-name span")
             poster_name = (
-                poster_name_element.text.strip() if poster_name_element else None
+                poster_name_element.text().strip() if poster_name_element else None
             )
 
         # Get image data
-        image_data = get_image_data(soup)
+        images, plans = split_images(self.base_url, get_image_data(tree))
 
         # Dates
-        updated_element = soup.select_one(
-            'p.stats-text:-soup-contains("actualizado el")'
+        updated_element = next(
+            (p for p in tree.css("p.stats-text") if "actualizado el" in p.text()),
+            None,
         )
-        updated = updated_element.text.split(" el ")[-1] if updated_element else None
+        updated = None
+        if updated_element:
+            # The date is optional, so a format we don't expect (e.g. with a year)
+            # leaves it empty instead of dropping the whole listing
+            try:
+                updated = parse_spanish_date(updated_element.text().split(" el ")[-1])
+            except (ValueError, KeyError):
+                pass
         time_stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         return Property(
@@ -116,9 +138,9 @@ class IdealistaParser(BaseParser):
             description=description,
             poster_type=poster_type,
             poster_name=poster_name,
-            features=get_features(soup),
-            images=get_images(self.base_url, image_data),
-            plans=get_plans(self.base_url, image_data),
+            features=get_features(tree),
+            images=images,
+            plans=plans,
             updated=updated,
             time_stamp=time_stamp,
         )
@@ -130,11 +152,8 @@ class IdealistaParser(BaseParser):
         Returns:
             The total number of pages of search results
         """
-        soup = BeautifulSoup(self.response.text, "html.parser")
-        total_results = soup.select_one("h1#h1-container").text
-        total_results = re.search(
-            r"([0-9.,]+)\s*(?:casas|anuncios)", total_results
-        ).group(1)
+        total_results = self.tree.css_first("h1#h1-container").text()
+        total_results = TOTAL_RESULTS_PATTERN.search(total_results).group(1)
         return math.ceil(
-            int(total_results.replace(".", "").replace(",", "")) / self.num_results_page
+            int(total_results.translate(THOUSANDS_SEPARATORS)) / self.num_results_page
         )
@@ -1,46 +1,45 @@
 import os
+from functools import lru_cache
 
-from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
-from prefect import task
+
+from src.orchestration import task
+
+
+@lru_cache(maxsize=4)
+def _get_bigquery_client(credentials_path: str) -> bigquery.Client:
+    """Get a BigQuery client for the given credentials, created once per process."""
+    return bigquery.Client.from_service_account_json(
+        os.path.expanduser(credentials_path)
+    )
 
 
 def _load_data_from_gcs_to_bigquery(
     bucket_name, parquet_file_path, dataset_id, table_id, credentials_path
 ):
     """
-    Load data from a GCS Parquet file into a BigQuery table.
+    Load data from GCS Parquet files into a BigQuery table.
 
     Args:
         bucket_name: The name of the GCS bucket containing the Parquet file.
-        parquet_file_path: The path to the Parquet file within the GCS bucket.
+        parquet_file_path: The path to the Parquet file within the GCS bucket. It
+        may contain a '*' wildcard to load several files in a single job.
         dataset_id: The ID of the BigQuery dataset.
         table_id: The ID of the BigQuery table.
         credentials_path: The path to the GCP credentials file.
     """
+    client = _get_bigquery_client(credentials_path)
 
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.expanduser(credentials_path)
-
-    client = bigquery.Client()
-
-    dataset_ref = client.dataset(dataset_id)
-    table_ref = dataset_ref.table(table_id)
-
-    # Check if the table exists, and create it if it doesn't
-    try:
-        client.get_table(table_ref)
-    except NotFound:
-        print(f"Creating table {table_id} in dataset {dataset_id}.")
-        table = bigquery.Table(table_ref)
-        client.create_table(table)
+    table_ref = client.dataset(dataset_id).table(table_id)
 
+    # The load job creates the table if it doesn't exist yet
     job_config = bigquery.LoadJobConfig(
         source_format=bigquery.SourceFormat.PARQUET,
+        create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
         write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
     )
 
     uri = f"gs://{bucket_name}/{parquet_file_path}"
-    table_ref = client.dataset(dataset_id).table(table_id)
 
     load_job = client.load_table_from_uri(uri, table_ref, job_config=job_config)
     load_job.result()
@@ -53,7 +52,7 @@ def load_data_from_gcs_to_bigquery(
     bucket_name, parquet_file_path, dataset_id, table_id, credentials_path
 ):
     """
-    Task to load data from a GCS Parquet file into a BigQuery table.
+    Task to load data from GCS Parquet files into a BigQuery table.
 
     This function is a Prefect task that wraps the private function _load_data_from_gcs_to_bigquery.
     It is designed to be used in a Prefect flow and will retry 3 times if it fails.
@@ -61,6 +60,7 @@ def load_data_from_gcs_to_bigquery(
     Args:
         bucket_name (str): The name of the GCS bucket containing the Parquet file.
         parquet_file_path (str): The path to the Parquet file within the GCS bucket.
+        It may contain a '*' wildcard to load several files in a single job.
         dataset_id (str): The ID of the BigQuery dataset.
         table_id (str): The ID of the BigQuery table.
         credentials_path (str): The path to the GCP credentials file.
@@ -1,23 +1,16 @@
+import io
+import time
+from typing import Optional
+
 import pandas as pd
 import pyarrow as pa
-from prefect import task
-
-
-def _prepare_parquet_file(df: pd.DataFrame, type_search: str) -> pa.Table:
-    """
-    Task to clean the data from the scraped properties.
+import pyarrow.parquet as pq
 
-    This function is a Prefect task that wraps the private function _clean_scraped_data.
-    It is designed to be used in a Prefect flow and will retry 3 times if it fails.
-
-    Args:
-        property_data (List[Dict[str, Any]]): The scraped property data to clean.
-        type_search (str): The type of search ("sale" or "rent").
+from src.orchestration import task
 
-    Returns:
-        pd.DataFrame: The cleaned property data.
-    """
-    schema_fields = [
+# Schema of the cleaned properties, for sale and share searches
+SALE_SCHEMA = pa.schema(
+    [
         ("ID_LISTING", pa.string()),
         ("URL", pa.string()),
         ("TYPE_PROPERTY", pa.string()),
@@ -76,23 +69,39 @@ def _prepare_parquet_file(df: pd.DataFrame, type_search: str) -> pa.Table:
         ("LAST_UPDATE_DATE", pa.date32()),
         ("TIMESTAMP", pa.timestamp("s")),
     ]
+)
+# Rentals also report whether the property is furnished and the kitchen equipped
+_FURNISHING_INDEX = SALE_SCHEMA.get_field_index("BALCONY") + 1
+RENT_SCHEMA = SALE_SCHEMA.insert(
+    _FURNISHING_INDEX, pa.field("FURNISHED", pa.bool_())
+).insert(_FURNISHING_INDEX + 1, pa.field("KITCHEN_EQUIPPED", pa.bool_()))
 
-    # Define the index at which you want to insert the new elements
-    index = schema_fields.index(("BALCONY", pa.bool_())) + 1
 
-    if type_search == "rent":
-        # Insert the new elements at the specified index
-        schema_fields.insert(index, ("FURNISHED", pa.bool_()))
-        schema_fields.insert(index + 1, ("KITCHEN_EQUIPPED", pa.bool_()))
+def _prepare_parquet_file(df: pd.DataFrame, type_search: str) -> pa.Table:
+    """
+    Task to clean the data from the scraped properties.
+
+    This function is a Prefect task that wraps the private function _clean_scraped_data.
+    It is designed to be used in a Prefect flow and will retry 3 times if it fails.
+
+    Args:
+        property_data (List[Dict[str, Any]]): The scraped property data to clean.
+        type_search (str): The type of search ("sale" or "rent").
 
-    # Check for missing columns and create empty ones with the appropriate data type
-    for field_name, field_type in schema_fields:
-        if field_name not in df.columns:
-            df[field_name] = pd.Series(dtype=field_type.to_pandas_dtype())
+    Returns:
+        pd.DataFrame: The cleaned property data.
+    """
+    schema = RENT_SCHEMA if type_search == "rent" else SALE_SCHEMA
 
-    # Create the Arrow schema and table
-    schema = pa.schema(schema_fields)
-    table = pa.Table.from_pandas(df, schema=schema)
+    # Convert column by column, missing columns are created as nulls of the
+    # appropriate data type directly in Arrow
+    arrays = [
+        pa.array(df[field.name], type=field.type, from_pandas=True)
+        if field.name in df.columns
+        else pa.nulls(len(df), type=field.type)
+        for field in schema
+    ]
+    table = pa.Table.from_arrays(arrays, schema=schema)
 
     return table
 
@@ -113,3 +122,149 @@ def prepare_parquet_file(df: pd.DataFrame, type_search: str) -> pa.Table:
         pa.Table: The prepared PyArrow table.
     """
     return _prepare_parquet_file(df, type_search)
+
+
+class ParquetBatchWriter:
+    """
+    Write PyArrow tables as row groups of in-memory Parquet files.
+
+    Batches are buffered in memory and written together once they reach
+    row_group_size rows or max_buffer_size bytes, so each file ends up with row
+    groups of a few thousand rows instead of one tiny row group per scraped batch
+    of 5-100 rows, which keeps the footer metadata small for columnar readers such
+    as BigQuery, while the buffered tables never take more than max_buffer_size.
+
+    Row groups are written to an in-memory buffer. Once the buffer grows past
+    max_file_size bytes, or the file has been open for max_file_age seconds, the
+    file is closed and handed back to the caller to be uploaded, and a new file is
+    started with the next table. The scraper is rate limited to a few thousand
+    properties per run, far below any of the size limits, so in practice the age
+    is what rolls files over and keeps a crash from losing the whole run.
+
+    The underlying ParquetWriter is opened lazily with the schema of the first
+    table written, so every subsequent table must share that schema (which is the
+    case for tables produced by prepare_parquet_file for the same type of search).
+
+    Attributes:
+        row_group_size (int): The number of buffered rows that triggers a write.
+        max_buffer_size (int): The size in bytes of the buffered tables that
+            triggers a write.
+        max_file_size (int): The size in bytes that triggers closing a file.
+        max_file_age (float): The seconds since the first table was written to a
+            file that trigger closing it.
+        compression (str): The compression codec used for the Parquet files.
+        compression_level (Optional[int]): The compression level of the codec.
+        num_rows (int): The number of rows written so far, including buffered ones.
+    """
+
+    def __init__(
+        self,
+        row_group_size: int = 5_000,
+        max_buffer_size: int = 16 * 1024 * 1024,
+        max_file_size: int = 64 * 1024 * 1024,
+        max_file_age: float = 30 * 60,
+        compression: str = "zstd",
+        compression_level: Optional[int] = 3,
+    ):
+        """
+        Initializes a new instance of the ParquetBatchWriter class.
+
+        Args:
+            row_group_size (int, optional): The number of buffered rows that
+            triggers a write. Defaults to 5,000.
+            max_buffer_size (int, optional): The size in bytes of the buffered
+            tables that triggers a write. Defaults to 16 MiB.
+            max_file_size (int, optional): The size in bytes that triggers closing
+            a file. Defaults to 64 MiB.
+            max_file_age (float, optional): The seconds since the first table was
+            written to a file that trigger closing it. Defaults to 30 minutes.
+            compression (str, optional): The compression codec used for the
+            Parquet files. Defaults to "zstd".
+            compression_level (Optional[int], optional): The compression level,
+            or None for the codec's default. Defaults to 3, which gives noticeably
+            smaller files than zstd's default level 1 at a similar write speed.
+        """
+        self.row_group_size = row_group_size
+        self.max_buffer_size = max_buffer_size
+        self.max_file_size = max_file_size
+        self.max_file_age = max_file_age
+        self.compression = compression
+        self.compression_level = compression_level
+        self.num_rows = 0
+        self._writer = None
+        self._sink = None
+        self._buffer = []
+        self._buffer_rows = 0
+        self._buffer_bytes = 0
+        self._file_start = None
+
+    def write(self, table: pa.Table) -> Optional[io.BytesIO]:
+        """
+        Append a PyArrow table to the current Parquet file.
+
+        Args:
+            table (pa.Table): The PyArrow table to append.
+
+        Returns:
+            Optional[io.BytesIO]: The contents of the Parquet file if it reached
+            max_file_size or max_file_age and was closed, None otherwise.
+        """
+        if self._file_start is None:
+            self._file_start = time.monotonic()
+        self._buffer.append(table)
+        self._buffer_rows += table.num_rows
+        self._buffer_bytes += table.nbytes
+        self.num_rows += table.num_rows
+        if (
+            self._buffer_rows >= self.row_group_size
+            or self._buffer_bytes >= self.max_buffer_size
+        ):
+            self._flush()
+            if self._sink.tell() >= self.max_file_size:
+                return self._close_file()
+        if time.monotonic() - self._file_start >= self.max_file_age:
+            return self.close()
+        return None
+
+    def close(self) -> Optional[io.BytesIO]:
+        """
+        Write any buffered rows and close the current Parquet file.
+
+        Returns:
+            Optional[io.BytesIO]: The contents of the last Parquet file, or None if
+            there was nothing left to write.
+        """
+        self._flush()
+        return self._close_file()
+
+    def _flush(self) -> None:
+        """Write the buffered tables as a single row group."""
+        if not self._buffer:
+            return
+        table = pa.concat_tables(self._buffer)
+        if self._writer is None:
+            self._sink = io.BytesIO()
+            self._writer = pq.ParquetWriter(
+                self._sink,
+                table.schema,
+                compression=self.compression,
+                compression_level=self.compression_level,
+                data_page_size=1 << 20,
+                write_statistics=True,
+            )
+        self._writer.write_table(table, row_group_size=table.num_rows)
+        self._buffer = []
+        self._buffer_rows = 0
+        self._buffer_bytes = 0
+
+    def _close_file(self) -> Optional[io.BytesIO]:
+        """Close the current Parquet file and return its contents."""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        sink = self._sink
+        sink.seek(0)
+        self._writer = None
+        self._sink = None
+        self._file_start = None
+        return sink
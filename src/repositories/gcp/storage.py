@@ -1,11 +1,21 @@
+import io
 import os
-import tempfile
 from datetime import datetime
+from functools import lru_cache
 
 import pyarrow as pa
 import pyarrow.parquet as pq
 from google.cloud import storage
-from prefect import task
+
+from src.orchestration import task
+
+
+@lru_cache(maxsize=4)
+def _get_storage_client(credentials_path: str) -> storage.Client:
+    """Get a GCS client for the given credentials, created once per process."""
+    return storage.Client.from_service_account_json(
+        os.path.expanduser(credentials_path)
+    )
 
 
 def _save_and_upload_to_gcs(
@@ -28,29 +38,54 @@ def _save_and_upload_to_gcs(
     Returns:
         str: The full path of the uploaded file in the GCS bucket.
     """
-    # Save the pyarrow Table as a Parquet file
-    with tempfile.NamedTemporaryFile(suffix=".parquet", delete=False) as temp_file:
-        pq.write_table(table, temp_file.name, compression="snappy")
-        temp_file_path = temp_file.name
-
-    # Explicitly close the temporary file
-    temp_file.close()
-
-    try:
-        today = datetime.today().strftime("%Y-%m-%d")
-        # Upload the Parquet file to GCS
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.expanduser(
-            credentials_path
-        )
-        client = storage.Client()
-        bucket = client.get_bucket(bucket_name)
-        full_path = os.path.join(to_path, f"{today}_{batch_number}.parquet")
-        blob = bucket.blob(full_path)
-        blob.upload_from_filename(temp_file_path)
-        print(f"File successfully uploaded to GCS: {full_path}.")
-
-    finally:
-        os.remove(temp_file_path)
+    # Write the Parquet file in memory, there is no need to go through the disk
+    buffer = io.BytesIO()
+    pq.write_table(
+        table,
+        buffer,
+        compression="zstd",
+        compression_level=3,
+        data_page_size=1 << 20,
+    )
+    buffer.seek(0)
+
+    today = datetime.today().strftime("%Y-%m-%d")
+    return _upload_buffer_to_gcs(
+        buffer,
+        bucket_name,
+        to_path,
+        credentials_path,
+        f"{today}_{batch_number}.parquet",
+    )
+
+
+def _upload_buffer_to_gcs(
+    buffer: io.BytesIO,
+    bucket_name: str,
+    to_path: str,
+    credentials_path: str,
+    file_name: str,
+):
+    """
+    Upload an in-memory Parquet file to a GCS bucket.
+
+    Args:
+        buffer (io.BytesIO): The contents of the Parquet file to upload.
+        bucket_name (str): The name of the GCS bucket to upload to.
+        to_path (str): The path in the GCS bucket to upload the file to.
+        credentials_path (str): The path to the GCP credentials file.
+        file_name (str): The name of the file in the GCS bucket.
+
+    Returns:
+        str: The full path of the uploaded file in the GCS bucket.
+    """
+    client = _get_storage_client(credentials_path)
+    bucket = client.get_bucket(bucket_name)
+    full_path = os.path.join(to_path, file_name)
+    blob = bucket.blob(full_path)
+    # Rewind so that retries upload the whole buffer again
+    blob.upload_from_file(buffer, rewind=True)
+    print(f"File successfully uploaded to GCS: {full_path}.")
 
     return full_path
 
@@ -82,3 +117,33 @@ def save_and_upload_to_gcs(
     return _save_and_upload_to_gcs(
         table, bucket_name, to_path, credentials_path, batch_number
     )
+
+
+@task(retries=3, log_prints=True)
+def upload_buffer_to_gcs(
+    buffer: io.BytesIO,
+    bucket_name: str,
+    to_path: str,
+    credentials_path: str,
+    file_name: str,
+):
+    """
+    Task to upload an in-memory Parquet file to a GCS bucket.
+
+    This function is a Prefect task that wraps the private function
+    _upload_buffer_to_gcs. It is designed to be used in a Prefect flow and will retry
+    3 times if it fails.
+
+    Args:
+        buffer (io.BytesIO): The contents of the Parquet file to upload.
+        bucket_name (str): The name of the GCS bucket to upload to.
+        to_path (str): The path in the GCS bucket to upload the file to.
+        credentials_path (str): The path to the GCP credentials file.
+        file_name (str): The name of the file in the GCS bucket.
+
+    Returns:
+        str: The full path of the uploaded file in the GCS bucket.
+    """
+    return _upload_buffer_to_gcs(
+        buffer, bucket_name, to_path, credentials_path, file_name
+    )
@@ -1,6 +1,10 @@
 import asyncio
 import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from http import HTTPStatus
+from typing import Optional
 
 import httpx
 
@@ -13,8 +17,9 @@ class BaseHTTPClient:
 
     This client handles concurrent requests, retries, and rate limits. It uses a
     semaphore to limit the number of concurrent requests, and implements an exponential
-    backoff with jitter for retries. It also handles rate limits by sleeping for a
-    specified duration when a rate limit is encountered.
+    backoff with jitter for retries. It also handles rate limits by pausing the rate
+    limiter for a specified duration when a rate limit is encountered, which stops
+    every request and not just the rate-limited one.
 
     Attributes:
         base_url (str): The base URL for the requests.
@@ -28,6 +33,8 @@ class BaseHTTPClient:
         rate_limiter (RateLimiter): A rate limiter to control the rate of requests.
         sleep_after_rate_limit (int): The duration to sleep (in seconds) when a rate
         limit is encountered.
+        paused_after_rate_limit (bool): Whether the long pause after a rate limit
+        has already been taken.
 
     Methods:
         request(url: str) -> httpx.Response: Make a request to the given URL,
@@ -36,7 +43,7 @@ class BaseHTTPClient:
         time before retrying the request.
         _get_backoff_time(retry_count: int, initial_backoff: float = 32, max_backoff:
         float = 64) -> float: Calculate backoff time with jitter.
-        _handle_rate_limit(response: httpx.Response, retry_count: int) -> None:
+        _handle_rate_limit(response: httpx.Response, sent_at: float) -> None:
         Handle rate-limited requests.
     """
 
@@ -66,14 +73,17 @@ class BaseHTTPClient:
         self.max_retries = max_retries
         self.rate_limiter = RateLimiter(tokens=1, fill_rate=1 / 27)
         self.sleep_after_rate_limit = sleep_after_rate_limit
+        self.paused_after_rate_limit = False
 
     async def request(self, url: str) -> httpx.Response:
         """
         Make a request to the given URL, handling retries and rate limits.
 
-        This method uses a semaphore to limit the number of concurrent requests.
-        It also implements retries with an exponential backoff and handles rate
-        limits by sleeping for a specified duration when a rate limit is encountered.
+        This method uses a semaphore to limit the number of requests in flight,
+        which is released while waiting for a token or before a retry. It also
+        implements retries with an exponential backoff and handles rate limits by
+        pausing every request for a specified duration when a rate limit is
+        encountered.
 
         Args:
             url (str): The URL to make the request to.
@@ -82,34 +92,39 @@ class BaseHTTPClient:
             httpx.Response: The response from the request. If the request fails after
             the maximum number of retries, it returns None.
         """
-        async with self.semaphore:
-            for retries in range(self.max_retries + 1):
-                try:
-                    await self.rate_limiter.wait_for_token()
-                    if self.last_successful_url:
-                        self.session.headers["referer"] = self.last_successful_url
-
-                    response = await self.session.get(url)
-
-                    if response.status_code == HTTPStatus.OK:
-                        self.last_successful_url = url
-                        print(f"Successful request: {url}")
-                        return response
-                    elif response.status_code in (
-                        HTTPStatus.FORBIDDEN,
-                        HTTPStatus.TOO_MANY_REQUESTS,
-                        HTTPStatus.SERVICE_UNAVAILABLE,
-                    ):
-                        await self._handle_rate_limit(response, retries)
-                    else:
-                        await self._wait_before_retry(
-                            response.status_code, url, retries
-                        )
-                except (httpx.RequestError, asyncio.TimeoutError):
-                    await self._wait_before_retry(-1, url, retries)
-
-            print(f"Failed to make request after {self.max_retries} retries.")
-            return None
+        for retries in range(self.max_retries + 1):
+            try:
+                await self.rate_limiter.wait_for_token()
+                # The referer is set per request, since concurrent requests share
+                # the session headers
+                headers = (
+                    {"referer": self.last_successful_url}
+                    if self.last_successful_url
+                    else None
+                )
+                # Only the request itself holds a slot, so that waiting for a
+                # token or backing off doesn't block other requests
+                async with self.semaphore:
+                    sent_at = time.monotonic()
+                    response = await self.session.get(url, headers=headers)
+
+                if response.status_code == HTTPStatus.OK:
+                    self.last_successful_url = url
+                    self.rate_limiter.increase_rate()
+                    return response
+                elif response.status_code in (
+                    HTTPStatus.FORBIDDEN,
+                    HTTPStatus.TOO_MANY_REQUESTS,
+                    HTTPStatus.SERVICE_UNAVAILABLE,
+                ):
+                    self._handle_rate_limit(response, sent_at)
+                else:
+                    await self._wait_before_retry(response.status_code, url, retries)
+            except (httpx.RequestError, asyncio.TimeoutError):
+                await self._wait_before_retry(-1, url, retries)
+
+        print(f"Failed to make request after {self.max_retries} retries.")
+        return None
 
     async def _wait_before_retry(self, status_code: int, url: str, retry_count: int):
         """
@@ -150,31 +165,75 @@ class BaseHTTPClient:
         jitter = random.uniform(0.5, 1.5)
         return wait_time * jitter
 
-    async def _handle_rate_limit(
-        self, response: httpx.Response, retry_count: int
-    ) -> None:
+    def _handle_rate_limit(self, response: httpx.Response, sent_at: float) -> None:
         """
         Handle rate-limited requests.
 
-        This method sleeps for a specified duration when a rate limit is encountered
-        for the first time. If a rate limit is encountered again, it raises a
-        RateLimitException.
+        This method halves the request rate and, if the response has a Retry-After
+        header, pauses the rate limiter for the time it asks for (at most
+        sleep_after_rate_limit seconds). Otherwise it pauses the rate limiter for a
+        specified duration when a rate limit is encountered for the first time, and
+        raises a RateLimitException if a rate limit is encountered again after that
+        pause. The request is retried once the pause is over.
+
+        Responses to requests sent before the current pause ended were part of the
+        burst that triggered it, so they just wait for it with the other requests.
 
         Args:
             response (httpx.Response): The response from the rate-limited request.
-            retry_count (int): The number of times the request has been retried.
+            sent_at (float): The time.monotonic() time at which it was sent.
         """
-        if retry_count == 0:
+        if sent_at < self.rate_limiter.resume_at:
+            return
+        # Slow down the request rate, it recovers gradually with each success
+        self.rate_limiter.decrease_rate()
+        retry_after = self._get_retry_after(response)
+        if retry_after is not None:
+            # The server told us how long to wait, no need for the long pause. The
+            # header is not trusted to ask for more than that pause though.
+            retry_after = min(retry_after, self.sleep_after_rate_limit)
+            print(
+                f"HTTP {response.status_code} - "
+                f"Retrying after {retry_after:.0f} seconds: {response.url}"
+            )
+            self.rate_limiter.pause(retry_after + random.uniform(0, 1))
+        elif not self.paused_after_rate_limit:
             print(
                 f"HTTP {response.status_code} - "
                 f"Retrying in {self.sleep_after_rate_limit / 3600} hours: {response.url}"
             )
-            await asyncio.sleep(self.sleep_after_rate_limit)
+            self.paused_after_rate_limit = True
+            self.rate_limiter.pause(self.sleep_after_rate_limit)
         else:
             raise RateLimitException(
                 f"HTTP {response.status_code} - Rate limit reached. URL: {response.url}"
             )
 
+    @staticmethod
+    def _get_retry_after(response: httpx.Response) -> Optional[float]:
+        """
+        Get the seconds to wait from the Retry-After header of a response.
+
+        Args:
+            response (httpx.Response): The response from the rate-limited request.
+
+        Returns:
+            Optional[float]: The seconds to wait, or None if the header is missing
+            or invalid. The header may hold either seconds or an HTTP date.
+        """
+        retry_after = response.headers.get("retry-after")
+        if retry_after is None:
+            return None
+        if retry_after.strip().isdigit():
+            return float(retry_after)
+        try:
+            retry_date = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if retry_date.tzinfo is None:
+            retry_date = retry_date.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_date - datetime.now(timezone.utc)).total_seconds())
+
 
 class RateLimitException(Exception):
     """An exception raised when the scraper encounters rate limiting."""
@@ -1,5 +1,9 @@
 import asyncio
 import random
+import time
+
+# Longest sleep while waiting for a token, so that rate increases are picked up
+MAX_WAIT_TIME = 60
 
 
 class RateLimiter:
@@ -15,14 +19,29 @@ class RateLimiter:
         tokens (int): The current number of tokens in the bucket.
         fill_rate (float): The rate at which the bucket is filled with tokens,
         in tokens per second.
+        max_fill_rate (float): The initial fill rate, which the fill rate recovers
+        up to after being decreased.
+        min_fill_rate (float): The lowest fill rate it can be decreased to.
+        resume_at (float): The time.monotonic() time until which no tokens are
+        handed out, set by pause().
+        capacity (int): The maximum number of tokens the bucket can hold.
 
     Methods:
         consume(amount: int) -> bool: Consumes the specified amount of tokens
         from the bucket.
         wait_for_token(): Waits until a token is available and then consumes it.
+        pause(seconds: float): Stops handing out tokens for the given seconds.
+        decrease_rate(factor: float): Multiplicatively decreases the fill rate.
+        increase_rate(step: float): Additively increases the fill rate.
     """
 
-    def __init__(self, tokens: int, fill_rate: float):
+    def __init__(
+        self,
+        tokens: int,
+        fill_rate: float,
+        capacity: int = None,
+        min_fill_rate: float = None,
+    ):
         """
         Initializes a new instance of the RateLimiter class.
 
@@ -30,10 +49,22 @@ class RateLimiter:
             tokens (int): The initial number of tokens in the bucket.
             fill_rate (float): The rate at which the bucket is filled with
             tokens, in tokens per second.
+            capacity (int, optional): The maximum number of tokens the bucket can
+            hold, which bounds the size of a burst. Defaults to the initial number
+            of tokens.
+            min_fill_rate (float, optional): The lowest fill rate it can be
+            decreased to, in tokens per second. Defaults to a tenth of the initial
+            fill rate.
         """
         self.tokens = tokens
         self.fill_rate = fill_rate
-        self.last_time = asyncio.get_event_loop().time()
+        self.max_fill_rate = fill_rate
+        self.min_fill_rate = (
+            min_fill_rate if min_fill_rate is not None else fill_rate / 10
+        )
+        self.capacity = capacity if capacity is not None else tokens
+        self.last_time = time.monotonic()
+        self.resume_at = 0.0
 
     async def consume(self, amount: int) -> bool:
         """
@@ -47,10 +78,11 @@ class RateLimiter:
         Returns:
             bool: True if the tokens were consumed; False otherwise.
         """
-        current_time = asyncio.get_event_loop().time()
+        current_time = time.monotonic()
         elapsed = current_time - self.last_time
         self.last_time = current_time
-        self.tokens += elapsed * self.fill_rate
+        # Tokens don't pile up while idle, so long pauses aren't followed by bursts
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.fill_rate)
 
         if self.tokens >= amount:
             self.tokens -= amount
@@ -62,7 +94,54 @@ class RateLimiter:
         """
         Waits until a token is available and then consumes it.
 
-        This method blocks until a token is available.
+        This method blocks until a token is available. Instead of polling, it sleeps
+        for the time the bucket needs to refill the missing part of a token, up to
+        MAX_WAIT_TIME seconds before checking again. While the rate limiter is
+        paused it waits for the pause to end first.
+        """
+        while True:
+            # The pause may start or be extended while sleeping, so it is checked
+            # again every time
+            while (pause_time := self.resume_at - time.monotonic()) > 0:
+                await asyncio.sleep(pause_time)
+            if await self.consume(1):
+                return
+            # A small jitter keeps requests from being evenly spaced
+            refill_time = min((1 - self.tokens) / self.fill_rate, MAX_WAIT_TIME)
+            await asyncio.sleep(refill_time + random.uniform(0, 1))
+
+    def pause(self, seconds: float):
+        """
+        Stops handing out tokens for the given seconds, for every waiting caller.
+
+        A pause never shortens one that is already in progress.
+
+        Args:
+            seconds (float): The duration of the pause in seconds.
+        """
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    def decrease_rate(self, factor: float = 0.5):
+        """
+        Multiplicatively decreases the fill rate, when the server pushes back.
+
+        The fill rate never goes below min_fill_rate, since every request hitting
+        the rate limit at the same time decreases it again.
+
+        Args:
+            factor (float, optional): The factor the fill rate is multiplied by.
+            Defaults to 0.5.
+        """
+        self.fill_rate = max(self.min_fill_rate, self.fill_rate * factor)
+
+    def increase_rate(self, step: float = None):
+        """
+        Additively increases the fill rate, up to the initial fill rate.
+
+        Args:
+            step (float, optional): The amount added to the fill rate. Defaults to
+            1% of the initial fill rate.
         """
-        while not await self.consume(1):
-            await asyncio.sleep(random.uniform(1, 5))
+        if step is None:
+            step = self.max_fill_rate / 100
+        self.fill_rate = min(self.max_fill_rate, self.fill_rate + step)
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+from typing import List, Set
+
+from src.orchestration import task
+
+SEEN_URLS_DB = "seen_urls.sqlite3"
+
+
+def get_seen_urls_db_path(credentials_path: str) -> str:
+    """Get the path of the seen URLs database, stored next to the GCP credentials."""
+    credentials_dir = os.path.dirname(os.path.expanduser(credentials_path))
+    return os.path.join(credentials_dir, SEEN_URLS_DB)
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Open the seen URLs database, creating its table if needed."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS seen "
+        "(table_id TEXT, url TEXT, PRIMARY KEY (table_id, url))"
+    )
+    return conn
+
+
+def _load_seen_urls(db_path: str, table_id: str) -> Set[str]:
+    """
+    Load the property URLs already loaded into a BigQuery table in previous runs.
+
+    Args:
+        db_path (str): The path to the SQLite database.
+        table_id (str): The BigQuery table the URLs were loaded into.
+
+    Returns:
+        Set[str]: The set of property URLs already loaded.
+    """
+    conn = _connect(db_path)
+    try:
+        rows = conn.execute("SELECT url FROM seen WHERE table_id = ?", (table_id,))
+        return {url for (url,) in rows}
+    finally:
+        conn.close()
+
+
+def _mark_urls_as_seen(db_path: str, table_id: str, urls: List[str]):
+    """
+    Record property URLs that have been loaded into a BigQuery table.
+
+    Args:
+        db_path (str): The path to the SQLite database.
+        table_id (str): The BigQuery table the URLs were loaded into.
+        urls (List[str]): The property URLs to record.
+    """
+    conn = _connect(db_path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO seen (table_id, url) VALUES (?, ?)",
+                ((table_id, url) for url in urls),
+            )
+    finally:
+        conn.close()
+
+
+@task(log_prints=True)
+def load_seen_urls(db_path: str, table_id: str) -> Set[str]:
+    """
+    Task to load the property URLs already loaded into a BigQuery table.
+
+    This function is a Prefect task that wraps the private function _load_seen_urls.
+
+    Args:
+        db_path (str): The path to the SQLite database.
+        table_id (str): The BigQuery table the URLs were loaded into.
+
+    Returns:
+        Set[str]: The set of property URLs already loaded.
+    """
+    return _load_seen_urls(db_path, table_id)
+
+
+@task(retries=3, log_prints=True)
+def mark_urls_as_seen(db_path: str, table_id: str, urls: List[str]):
+    """
+    Task to record property URLs that have been loaded into a BigQuery table.
+
+    This function is a Prefect task that wraps the private function
+    _mark_urls_as_seen. It is designed to be used in a Prefect flow and will retry
+    3 times if it fails.
+
+    Args:
+        db_path (str): The path to the SQLite database.
+        table_id (str): The BigQuery table the URLs were loaded into.
+        urls (List[str]): The property URLs to record.
+    """
+    _mark_urls_as_seen(db_path, table_id, urls)
@@ -1,7 +1,10 @@
 import asyncio
+import multiprocessing
 import random
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from http import HTTPStatus
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 
 import httpx
 from tqdm.asyncio import tqdm_asyncio
@@ -12,66 +15,138 @@ from src.repositories.http.base_http_client import BaseHTTPClient
 from src.repositories.http.random_headers import get_random_header
 
 
+def parse_property_page(html: bytes, url: str) -> Property:
+    """
+    Parse the HTML of a property page. It is a module-level function so that it can
+    run in a worker process.
+
+    Args:
+        html (bytes): HTML of the property page.
+        url (str): URL of the property page.
+
+    Returns:
+        Property: Parsed property data.
+    """
+    response = httpx.Response(
+        HTTPStatus.OK, content=html, request=httpx.Request("GET", url)
+    )
+    return IdealistaParser(response).parse_property()
+
+
 class IdealistaScraper:
     """
     Scraper class for fetching and parsing properties from the Idealista website.
 
     Attributes:
         base_url (str): The base URL for Idealista.
-        batch_size (int): Number of requests after which a sleep is initiated to avoid
-        rate limiting.
         num_results_page (int): Number of results per search page on Idealista.
         max_pages (int): Maximum number of pages to scrape.
+        concurrency (int): Maximum number of in-flight requests.
+        parse_workers (int): Number of processes used to parse property pages.
     """
 
     def __init__(
         self,
         base_url: str = "https://www.idealista.com",
-        batch_size: int = 30,
         num_results_page: int = 30,
         max_pages: int = 60,
+        concurrency: int = 1,
+        parse_workers: int = 1,
     ):
         """
         Initialize the IdealistaScraper with the given parameters.
 
         Args:
             base_url (str): The base URL for Idealista.
-            batch_size (int, optional): Number of requests after which a sleep is
-            initiated. Defaults to 30.
             num_results_page (int, optional): Number of results per search page.
             Defaults to 30.
             max_pages (int, optional): Maximum number of pages to scrape.
             Defaults to 60.
+            concurrency (int, optional): Maximum number of in-flight requests. It
+            bounds both the http client semaphore and its connection pool.
+            Defaults to 1.
+            parse_workers (int, optional): Number of processes used to parse
+            property pages. Pages arrive at most once every ~27 seconds, which a
+            single process parses with plenty of room, and every extra process
+            costs memory. Defaults to 1.
         """
+        if parse_workers < 1:
+            raise ValueError(f"parse_workers must be at least 1, got {parse_workers}")
         self.base_url = base_url
-        self.batch_size = batch_size
         self.num_results_page = num_results_page
         self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.parse_workers = parse_workers
+        self.parse_pool = None
 
     async def __aenter__(self):
         """
         Asynchronous context manager's enter method.
         Initializes the http client with a random header and makes a warm-up request to
-        the base URL.
+        the base URL. The same client (and its connection pool) is meant to be reused
+        for the whole lifetime of the scraper.
         """
-        self.http_client = BaseHTTPClient(self.base_url)
+        self.http_client = BaseHTTPClient(
+            self.base_url, concurrent_requests_limit=self.concurrency
+        )
         headers = get_random_header()
+        # Requests are paced by the rate limiter (~1 every 27 seconds), so the
+        # keep-alive expiry must outlive that gap for connections to be reused.
+        # With HTTP/2 concurrent requests are multiplexed over a single connection.
         self.http_client.session = httpx.AsyncClient(
-            headers=headers, follow_redirects=True, timeout=60
+            headers=headers,
+            follow_redirects=True,
+            timeout=60,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+                keepalive_expiry=60,
+            ),
         )
-        await self.http_client.request(self.base_url)
+        self.parse_pool = self._new_parse_pool()
+        response = await self.http_client.request(self.base_url)
+        if response is not None:
+            print(f"Connected to {self.base_url} using {response.http_version}")
         return self
 
+    def _new_parse_pool(self) -> ProcessPoolExecutor:
+        """
+        Start the worker processes that parse property pages.
+
+        Property pages are parsed in worker processes, so parsing doesn't block the
+        event loop while other pages are fetched. Workers are started from a fork
+        server rather than forked from this process, which already runs Prefect
+        and asyncio threads whose locks would be inherited in an unknown state.
+        Platforms without a fork server (Windows) spawn them instead.
+
+        Returns:
+            ProcessPoolExecutor: The pool of parsing worker processes.
+        """
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            mp_context = multiprocessing.get_context("forkserver")
+        else:
+            mp_context = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(
+            max_workers=self.parse_workers, mp_context=mp_context
+        )
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """
         Asynchronous context manager's exit method.
-        Closes the http client session.
+        Closes the http client session and the parsing worker processes.
         """
         if self.http_client.session:
             await self.http_client.session.aclose()
             self.http_client.session = None
+        if self.parse_pool:
+            # Waiting for the worker processes to exit blocks, so it runs in a thread
+            await asyncio.to_thread(self.parse_pool.shutdown, cancel_futures=True)
+        self.parse_pool = None
 
-    async def scrape_properties(self, urls: List[str]) -> List[Property]:
+    async def scrape_properties(
+        self, urls: List[str]
+    ) -> Tuple[List[Property], List[str]]:
         """
         Scrape property details for a given list of URLs.
 
@@ -79,69 +154,142 @@ class IdealistaScraper:
             urls (List[str]): List of property URLs to scrape.
 
         Returns:
-            List[Property]: List of Property objects with scraped data.
+            Tuple[List[Property], List[str]]: List of Property objects with scraped
+            data and list of URLs whose request failed after all the retries.
         """
         properties = []
+        failed_urls = []
         random.shuffle(urls)
-        tasks = [self._fetch_property(url) for url in urls]
-        request_counter = 0
-        for future in tqdm_asyncio(
-            asyncio.as_completed(tasks),
-            total=len(tasks),
-            desc="Scraping Properties",
-            ncols=100,
-        ):
-            property_data = await future
-            if property_data:
-                properties.append(property_data)
-            # Random sleep time between 2 and 10 seconds to avoid rate limiting
-            request_counter += 1
-            if request_counter % self.batch_size == 0:
-                sleep_time = random.uniform(2, 10)
-                print(f"Sleeping for {sleep_time: .2f} seconds to avoid rate limiting")
-                await asyncio.sleep(sleep_time)
-        return properties
-
-    async def _fetch_property(self, url):
-        """
-        Fetch and parse a single property page.
+        # Fetching and parsing run as separate stages: a fixed pool of fetchers
+        # pulls URLs from a queue and hands the responses over to the parsers, so
+        # fetchers don't wait for parsing and in-flight coroutines stay bounded
+        url_queue = asyncio.Queue()
+        for url in urls:
+            url_queue.put_nowait(url)
+        parse_queue = asyncio.Queue(maxsize=100)
+        progress_bar = tqdm_asyncio(
+            total=len(urls), desc="Scraping Properties", ncols=100
+        )
+
+        # Requests are paced by the http client rate limiter
+        async def fetcher():
+            while not url_queue.empty():
+                url, response = await self._fetch_property(url_queue.get_nowait())
+                if response is None:
+                    failed_urls.append(url)
+                    progress_bar.update(1)
+                else:
+                    await parse_queue.put((url, response))
+
+        async def parser():
+            # A `None` item signals that there is nothing else to parse
+            while (item := await parse_queue.get()) is not None:
+                try:
+                    property_data = await self._parse_property(*item)
+                except BrokenProcessPool:
+                    # The page is fetched again with the rest of the failed URLs
+                    failed_urls.append(item[0])
+                    property_data = None
+                if property_data:
+                    properties.append(property_data)
+                progress_bar.update(1)
+
+        fetchers = [
+            asyncio.create_task(fetcher())
+            for _ in range(min(self.concurrency, len(urls)))
+        ]
+        parsers = [asyncio.create_task(parser()) for _ in range(self.parse_workers)]
+        try:
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await parse_queue.put(None)
+            await asyncio.gather(*parsers)
+        finally:
+            for task in fetchers + parsers:
+                task.cancel()
+            progress_bar.close()
+        return properties, failed_urls
+
+    async def _fetch_property(self, url) -> Tuple[str, Optional[httpx.Response]]:
+        """
+        Fetch a single property page.
 
         Args:
             url (str): URL of the property to fetch.
 
         Returns:
-            Property: Parsed property data.
+            Tuple[str, Optional[httpx.Response]]: The URL and its response, which is
+            None if the request failed.
         """
         response = await self.http_client.request(url)
         if response is not None and response.status_code == HTTPStatus.OK:
-            try:
-                parser = IdealistaParser(response)
-                return parser.parse_property()
-            except Exception as e:
-                print(f"Failed to parse property at {url}. Error: {str(e)}")
-                return None
+            return url, response
         else:
+            return url, None
+
+    async def _parse_property(self, url, response) -> Optional[Property]:
+        """
+        Parse a single property page in the parsing worker processes.
+
+        Args:
+            url (str): URL of the property.
+            response (httpx.Response): Response of the property page.
+
+        Returns:
+            Property: Parsed property data, or None if the page could not be parsed.
+
+        Raises:
+            BrokenProcessPool: If a worker process died, e.g. killed for running out
+            of memory. The pool is replaced so that the next pages can be parsed.
+        """
+        loop = asyncio.get_running_loop()
+        parse_pool = self.parse_pool
+        try:
+            return await loop.run_in_executor(
+                parse_pool,
+                parse_property_page,
+                response.content,
+                str(response.url),
+            )
+        except BrokenProcessPool:
+            # Every pending parse fails with the broken pool, but only the first
+            # one replaces it
+            if self.parse_pool is parse_pool:
+                print(f"Parsing worker died while parsing {url}. Restarting the pool")
+                parse_pool.shutdown(wait=False, cancel_futures=True)
+                self.parse_pool = self._new_parse_pool()
+            raise
+        except Exception as e:
+            print(f"Failed to parse property at {url}. Error: {str(e)}")
             return None
 
-    async def scrape_search(self, url, paginate=True) -> List[str]:
+    async def scrape_search(self, url, paginate=True) -> AsyncIterator[str]:
         """
         Scrape property URLs from search result pages.
 
+        URLs are yielded as soon as each search results page is parsed, so that
+        property pages can be scraped while the search is still being paginated.
+        Listings can show up in more than one page when the results shift during
+        pagination, so each URL is only yielded once.
+
         Args:
             url (str): Search result URL to scrape.
             paginate (bool, optional): Whether to scrape all pages of search results
             or just the first one. Defaults to True.
 
-        Returns:
-            List[str]: List of scraped property URLs.
+        Yields:
+            str: Scraped property URLs.
         """
-        property_urls = []
         first_page = await self.http_client.request(url)
         parser = IdealistaParser(first_page, self.num_results_page)
-        property_urls.extend(parser.parse_search())
+        found_urls = set()
+        for property_url in parser.parse_search():
+            if property_url not in found_urls:
+                found_urls.add(property_url)
+                yield property_url
 
         if not paginate:
-            return property_urls
+            return
 
         total_pages = parser.get_total_pages()
         if total_pages > self.max_pages:
@@ -153,27 +301,32 @@ class IdealistaScraper:
 
         print(f"scraping {total_pages} pages of search results concurrently")
 
+        search_url = str(first_page.url)
         tasks = [
-            self.http_client.request(f"{first_page.url}pagina-{page}.htm")
+            asyncio.create_task(
+                self.http_client.request(f"{search_url}pagina-{page}.htm")
+            )
             for page in range(2, total_pages + 1)
         ]
-        for future in tqdm_asyncio(
-            asyncio.as_completed(tasks),
-            total=len(tasks),
-            desc="Scraping Search Results",
-            ncols=100,
-        ):
-            try:
-                response = await future
-                parser = IdealistaParser(response)
-                urls = parser.parse_search()
-                property_urls.extend(urls)
-            except Exception as e:
-                print(f"Failed to parse search page. Error: {str(e)}")
-
-        # Sleep after scraping pages successfully
-        sleep_time = random.uniform(2, 10)
-        print(f"Sleeping for {sleep_time: .2f} seconds to avoid rate limiting")
-        await asyncio.sleep(sleep_time)
-
-        return property_urls
+        try:
+            for future in tqdm_asyncio(
+                asyncio.as_completed(tasks),
+                total=len(tasks),
+                desc="Scraping Search Results",
+                ncols=100,
+            ):
+                try:
+                    response = await future
+                    parser = IdealistaParser(response)
+                    urls = parser.parse_search()
+                except Exception as e:
+                    print(f"Failed to parse search page. Error: {str(e)}")
+                    continue
+                for property_url in urls:
+                    if property_url not in found_urls:
+                        found_urls.add(property_url)
+                        yield property_url
+        finally:
+            # Stop fetching search pages if the consumer stops early
+            for task in tasks:
+                task.cancel()
@@ -1,38 +1,44 @@
-from dataclasses import asdict
-from typing import Any, Dict, List
+from typing import AsyncIterator, List, Tuple
 
-from prefect import task
+import pyarrow as pa
 
+from src.orchestration import task
 from src.scrapers.idealista_scraper import IdealistaScraper
-from src.scrapers.utils import flatten_dict
+from src.scrapers.utils import properties_to_table
 
 
-@task(retries=3, log_prints=True)
-async def scrape_search_task(url: str, paginate=True) -> List[str]:
-    """Scrape a search page to get property URLs
+async def scrape_search_task(
+    scraper: IdealistaScraper, url: str, paginate=True
+) -> AsyncIterator[str]:
+    """Scrape a search page to get property URLs as they are found
+    This is a plain async generator instead of a Prefect task, since Prefect tasks
+    cannot stream their results.
     Args:
         scraper: An IdealistaScraper instance
         url: The URL of the search page
         paginate: Whether to scrape all pages of the search results (default True)
-    Returns:
-        A list of property URLs
+    Yields:
+        Property URLs
     """
-    async with IdealistaScraper() as scraper:
-        return await scraper.scrape_search(url, paginate=paginate)
+    async for property_url in scraper.scrape_search(url, paginate=paginate):
+        yield property_url
 
 
-@task(retries=3, log_prints=True)
-async def scrape_properties_task(property_urls: List[str]) -> List[Dict[str, Any]]:
+@task(log_prints=True)
+async def scrape_properties_task(
+    scraper: IdealistaScraper, property_urls: List[str]
+) -> Tuple[pa.Table, List[str]]:
     """Scrape a list of property pages to get property data
+    Requests are already retried one by one by the HTTP client, so the task itself
+    is not retried: that would fetch again the properties that succeeded. The URLs
+    that failed are returned instead so they can be scheduled again.
     Args:
         scraper: An IdealistaScraper instance
         property_urls: A list of property URLs
     Returns:
-        A list of dictionaries representing each property
+        A flat PyArrow table with one row per property and the list of property URLs
+        that could not be fetched
     """
-    async with IdealistaScraper() as scraper:
-        scraped_properties = await scraper.scrape_properties(property_urls)
-
-    flattened_properties = [flatten_dict(asdict(item)) for item in scraped_properties]
+    scraped_properties, failed_urls = await scraper.scrape_properties(property_urls)
 
-    return flattened_properties
+    return properties_to_table(scraped_properties), failed_urls
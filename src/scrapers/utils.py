@@ -1,21 +1,52 @@
-from typing import Any, Dict
+from dataclasses import fields
+from typing import List
 
+import pyarrow as pa
 
-def flatten_dict(d: dict, prefix: str = "") -> Dict[str, Any]:
-    """Flatten a nested dictionary by concatenating keys with underscores.
+from src.models.property import Property
+
+
+def flatten_struct_columns(table: pa.Table, sep: str = "_") -> pa.Table:
+    """Flatten the struct columns of a table by concatenating field names.
+
+    Args:
+        table: The PyArrow table to flatten
+        sep: The separator between the parent and child field names (default '_')
+
+    Returns:
+        A table without struct columns, where nested fields are stored in columns
+        named after the concatenation of the original field names
+    """
+    while any(pa.types.is_struct(field.type) for field in table.schema):
+        columns, names = [], []
+        for name, column in zip(table.column_names, table.columns):
+            if pa.types.is_struct(column.type):
+                for child, child_column in zip(column.type, column.flatten()):
+                    columns.append(child_column)
+                    names.append(f"{name}{sep}{child.name}")
+            else:
+                columns.append(column)
+                names.append(name)
+        table = pa.Table.from_arrays(columns, names=names)
+    return table
+
+
+def properties_to_table(properties: List[Property]) -> pa.Table:
+    """Convert scraped properties into a flat PyArrow table.
 
     Args:
-        d: The dictionary to flatten
-        prefix: A string to prepend to each key (default '')
+        properties: The scraped properties
 
     Returns:
-        A flattened dictionary, where each key is a concatenation of the
-        original keys separated by underscores
+        A table with one row per property, where nested dictionaries such as the
+        features are flattened into columns named like `features_Edificio`
     """
-    flat_dict = {}
-    for k, v in d.items():
-        if isinstance(v, dict):
-            flat_dict.update(flatten_dict(v, f"{prefix}{k}_"))
-        else:
-            flat_dict[f"{prefix}{k}"] = v
-    return flat_dict
+    # Build the columns straight from the dataclass attributes, since asdict would
+    # deep copy every property before PyArrow copies it again
+    table = pa.Table.from_pydict(
+        {
+            field.name: [getattr(item, field.name) for item in properties]
+            for field in fields(Property)
+        }
+    )
+    return flatten_struct_columns(table)